@@ -1,6 +1,455 @@
 import pandas as pd
 import numpy as np
 import itertools
+import bisect
+import functools
+from collections import OrderedDict, namedtuple
+
+
+# Cards are plain ints 0..51 : card = (number - 2) * 4 + suit, so that
+# card >> 2 is the number index (0 for a 2, 12 for an ace) and card & 3 the suit.
+# The 'H10' style strings are only used for input() and printing.
+SUITS = ['H','S','C','D']
+NUMBERS = list(range(2,15))
+DECK = tuple(range(52))
+
+
+def card_from_string(card):
+    "'H10' -> 32"
+    return (int(card[1:]) - 2) * 4 + SUITS.index(card[:1])
+
+
+def card_to_string(card):
+    "32 -> 'H10'"
+    return SUITS[card & 3] + str((card >> 2) + 2)
+
+
+def cards_to_strings(cards):
+    "Convert a sequence of cards (None for unknown) to their string form"
+    return [None if card is None else card_to_string(card) for card in cards]
+
+
+# Hand categories, from worst to best
+HIGH_CARD, PAIR, TWO_PAIR, THREE_OF_A_KIND, STRAIGHT, FLUSH, FULL_HOUSE, FOUR_OF_A_KIND, STRAIGHT_FLUSH = range(9)
+CATEGORY_NAMES = ['high card', 'pair', 'two pair', 'three of a kind', 'straight', 'flush', 'full house', 'four of a kind', 'straight_flush']
+
+# Lookup tables for the 5 card evaluator (Cactus Kev style).
+# A hand rank is an int from 1 (7-5-4-3-2 offsuit) to 7462 (royal flush), higher is better.
+#   _FLUSH_TABLE[bits]   : 5 cards of the same suit, indexed by the 13 bit number mask
+#   _UNIQUE_TABLE[bits]  : 5 different numbers, not suited (straights and high cards), 0 otherwise
+#   _PRODUCT_TABLE[prod] : hands with a paired number, keyed by the product of the number primes
+_PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+_RANK_BIT = [1 << (card >> 2) for card in DECK]
+_RANK_PRIME = [_PRIMES[card >> 2] for card in DECK]
+_FLUSH_TABLE = [0] * 8192
+_UNIQUE_TABLE = [0] * 8192
+_PRODUCT_TABLE = {}
+_CATEGORY_START = []  # lowest rank of every category
+
+
+def _straight_tops():
+    "(mask, top number index) of the 10 straights, the wheel A-2-3-4-5 has top 3 (a 5)"
+    straights = [(0b11111 << (top - 4), top) for top in range(4, 13)]
+    return [(0b1000000001111, 3)] + straights
+
+
+def _build_tables():
+    straights = _straight_tops()
+    straight_masks = set(mask for mask, top in straights)
+    no_straight = []  # masks of 5 different numbers without a straight, worst first
+    for numbers in itertools.combinations(range(13), 5):
+        mask = sum(1 << n for n in numbers)
+        if mask not in straight_masks:
+            no_straight.append((sorted(numbers, reverse=True), mask))
+    no_straight.sort()
+
+    def prime_product(numbers):
+        product = 1
+        for n in numbers:
+            product *= _PRIMES[n]
+        return product
+
+    others = lambda *used: [n for n in range(12, -1, -1) if n not in used]
+    pairs = sorted((p, k) for p in range(13) for k in itertools.combinations(others(p), 3))
+    two_pairs = sorted((p1, p2, k) for p1 in range(13) for p2 in range(p1) for k in others(p1, p2))
+    threes = sorted((t, k) for t in range(13) for k in itertools.combinations(others(t), 2))
+    full_houses = sorted((t, p) for t in range(13) for p in others(t))
+    fours = sorted((q, k) for q in range(13) for k in others(q))
+
+    rank = 1
+    def category(entries):
+        nonlocal rank
+        _CATEGORY_START.append(rank)
+        for table, key in entries:
+            table[key] = rank
+            rank += 1
+
+    category((_UNIQUE_TABLE, mask) for numbers, mask in no_straight)
+    category((_PRODUCT_TABLE, prime_product((p, p) + k)) for p, k in pairs)
+    category((_PRODUCT_TABLE, prime_product((p1, p1, p2, p2, k))) for p1, p2, k in two_pairs)
+    category((_PRODUCT_TABLE, prime_product((t, t, t) + k)) for t, k in threes)
+    category((_UNIQUE_TABLE, mask) for mask, top in straights)
+    category((_FLUSH_TABLE, mask) for numbers, mask in no_straight)
+    category((_PRODUCT_TABLE, prime_product((t, t, t, p, p))) for t, p in full_houses)
+    category((_PRODUCT_TABLE, prime_product((q, q, q, q, k))) for q, k in fours)
+    category((_FLUSH_TABLE, mask) for mask, top in straights)
+
+
+_build_tables()
+ROYAL_FLUSH_RANK = _FLUSH_TABLE[0b1111100000000]
+
+
+def evaluate_5(hand):
+    "Rank of a 5 card hand as one comparable int, higher is better"
+    a, b, c, d, e = hand
+    bits = _RANK_BIT[a] | _RANK_BIT[b] | _RANK_BIT[c] | _RANK_BIT[d] | _RANK_BIT[e]
+    if (a & 3) == (b & 3) == (c & 3) == (d & 3) == (e & 3):
+        return _FLUSH_TABLE[bits]
+    rank = _UNIQUE_TABLE[bits]
+    if rank:
+        return rank
+    return _PRODUCT_TABLE[_RANK_PRIME[a] * _RANK_PRIME[b] * _RANK_PRIME[c] * _RANK_PRIME[d] * _RANK_PRIME[e]]
+
+
+# Best of 5 to 7 cards without going through the 21 subsets.
+#   _FLUSH_BEST[bits]  : best straight flush / flush of a suit holding the numbers in bits (5 or more bits set)
+#   _NUMBERS_BEST[key] : best hand without flush of a multiset of numbers, the key is the sum
+#                        of 5 ** number over the cards so it can be built by adding _QUINARY[card]
+# With at most 7 cards a flush can not come together with a full house or four of a kind,
+# so when a suit has 5 cards the flush table alone gives the best hand.
+_QUINARY = [5 ** (card >> 2) for card in DECK]
+_FLUSH_BEST = [0] * 8192
+_NUMBERS_BEST = {}
+
+
+def _best_flush_numbers(bits):
+    "13 bit mask of the best 5 numbers among the suited numbers in bits"
+    for mask, top in reversed(_straight_tops()):
+        if bits & mask == mask:
+            return mask
+    while bin(bits).count('1') > 5:
+        bits &= bits - 1  # drop the lowest number
+    return bits
+
+
+def _build_best_tables():
+    for bits in range(8192):
+        if bin(bits).count('1') >= 5:
+            _FLUSH_BEST[bits] = _FLUSH_TABLE[_best_flush_numbers(bits)]
+
+    five = [5 ** n for n in range(13)]
+    for numbers in itertools.combinations_with_replacement(range(13), 5):
+        if numbers[0] == numbers[4]:
+            continue  # only 4 cards of every number
+        key = sum(five[n] for n in numbers)
+        if len(set(numbers)) == 5:
+            _NUMBERS_BEST[key] = _UNIQUE_TABLE[sum(1 << n for n in numbers)]
+        else:
+            product = 1
+            for n in numbers:
+                product *= _PRIMES[n]
+            _NUMBERS_BEST[key] = _PRODUCT_TABLE[product]
+
+    # a 6 (7) number hand is as good as its best 5 (6) number sub hand
+    for size in (6, 7):
+        for numbers in itertools.combinations_with_replacement(range(13), size):
+            if any(numbers[i] == numbers[i + 4] for i in range(size - 4)):
+                continue
+            key = sum(five[n] for n in numbers)
+            _NUMBERS_BEST[key] = max(_NUMBERS_BEST[key - five[n]] for n in set(numbers))
+
+
+_build_best_tables()
+
+
+def evaluate_7(hand):
+    "Rank of the best 5 card hand in 5, 6 or 7 cards, higher is better"
+    suits = [0, 0, 0, 0]
+    key = 0
+    for card in hand:
+        suits[card & 3] += 1
+        key += _QUINARY[card]
+    most = max(suits)
+    if most >= 5:
+        suit = suits.index(most)
+        bits = 0
+        for card in hand:
+            if card & 3 == suit:
+                bits |= _RANK_BIT[card]
+        return _FLUSH_BEST[bits]
+    return _NUMBERS_BEST[key]
+
+
+def best_hand(hand):
+    "(rank, best 5 cards) of 5 to 7 cards, only meant for printing the result"
+    hand = list(hand)
+    rank = evaluate_7(hand)
+    suits = [card & 3 for card in hand]
+    for suit in range(4):
+        if suits.count(suit) >= 5:
+            bits = 0
+            for card in hand:
+                if card & 3 == suit:
+                    bits |= _RANK_BIT[card]
+            best = _best_flush_numbers(bits)
+            return rank, [card for card in hand if card & 3 == suit and _RANK_BIT[card] & best]
+
+    # drop cards as long as the rest still makes the same hand
+    key = sum(_QUINARY[card] for card in hand)
+    while len(hand) > 5:
+        for card in sorted(hand):
+            if _NUMBERS_BEST[key - _QUINARY[card]] == rank:
+                hand.remove(card)
+                key -= _QUINARY[card]
+                break
+    return rank, hand
+
+
+# NumPy copies of the tables for CardScores.score_batch, the number multisets are
+# looked up with a binary search over the sorted keys
+_QUINARY_ARRAY = np.array(_QUINARY, dtype=np.int64)
+_RANK_BIT_ARRAY = np.array(_RANK_BIT, dtype=np.int64)
+_FLUSH_BEST_ARRAY = np.array(_FLUSH_BEST, dtype=np.int32)
+_NUMBERS_KEYS = np.array(sorted(_NUMBERS_BEST), dtype=np.int64)
+_NUMBERS_RANKS = np.array([_NUMBERS_BEST[key] for key in _NUMBERS_KEYS.tolist()], dtype=np.int32)
+_BATCH_CHUNK = 1 << 18
+
+
+def score_batch(cards):
+    "Ranks of many hands at once, cards is an int array of shape (N, 5..7), returns N ints"
+    cards = np.asarray(cards, dtype=np.intp)
+    if len(cards) > _BATCH_CHUNK:
+        return np.concatenate([score_batch(cards[i:i + _BATCH_CHUNK]) for i in range(0, len(cards), _BATCH_CHUNK)])
+
+    keys = _QUINARY_ARRAY[cards].sum(axis=1)
+    ranks = _NUMBERS_RANKS[np.searchsorted(_NUMBERS_KEYS, keys)]
+
+    suits = cards & 3
+    bits = _RANK_BIT_ARRAY[cards]
+    for suit in range(4):
+        in_suit = suits == suit
+        flush = in_suit.sum(axis=1) >= 5
+        if flush.any():
+            ranks[flush] = _FLUSH_BEST_ARRAY[(bits[flush] * in_suit[flush]).sum(axis=1)]
+    return ranks
+
+
+@functools.lru_cache(maxsize=None)
+def _index_combinations(n, k):
+    "All k-combinations of range(n) as an int array, e.g. the 990 opponent holdings out of 45 cards"
+    return np.array(list(itertools.combinations(range(n), k)), dtype=np.intp).reshape(-1, k)
+
+
+def canonical_suits(*groups):
+    """
+    Rename the suits of some card groups (e.g. hole cards and board) so that all
+    suit-isomorphic situations give the same result, returned as sorted tuples.
+    Suits are ordered by what they hold in every group, suits holding the same
+    numbers in every group are interchangeable so their order does not matter.
+    """
+    groups = [[card for card in group if card is not None] for group in groups]
+    signatures = [[0] * len(groups) for suit in range(4)]  # number mask of every suit in every group
+    for index, group in enumerate(groups):
+        for card in group:
+            signatures[card & 3][index] |= _RANK_BIT[card]
+    order = sorted(range(4), key=signatures.__getitem__, reverse=True)
+    new_suit = [0] * 4
+    for index, suit in enumerate(order):
+        new_suit[suit] = index
+    return tuple(tuple(sorted([(card & ~3) | new_suit[card & 3] for card in group])) for group in groups)
+
+
+def _showdown_ranks(hole, board):
+    "(machine rank, sorted ranks of every opponent holding) for 2 hole cards on a full board"
+    return _showdown_ranks_batch([hole], [board])[0]
+
+
+def _showdown_ranks_batch(holes, boards):
+    "_showdown_ranks of every (hole, board) pair, all the hands scored in one batch"
+    holes = np.array(holes, dtype=np.intp).reshape(-1, 2)
+    boards = np.array(boards, dtype=np.intp).reshape(-1, 5)
+    dead = np.zeros((len(holes), 52), dtype=bool)
+    np.put_along_axis(dead, np.hstack([holes, boards]), True, axis=1)
+    rest = np.nonzero(~dead)[1].reshape(len(holes), 45)
+    holdings = rest[:, _index_combinations(45, 2)]
+
+    hands = np.empty(holdings.shape[:2] + (7,), dtype=np.intp)
+    hands[:, :, :5] = boards[:, None, :]
+    hands[:, :, 5:] = holdings
+    opp_ranks = np.sort(score_batch(hands.reshape(-1, 7)).reshape(len(holes), -1), axis=1).astype(np.int16)
+    ranks = score_batch(np.hstack([holes, boards]))
+
+    return list(zip(ranks.tolist(), opp_ranks))
+
+
+CacheInfo = namedtuple("CacheInfo", "hits misses size maxsize")
+
+
+class ShowdownCache:
+    """
+    Bounded LRU cache of showdowns keyed on the suit-canonical (hole cards, board), with hit / miss counters.
+    An entry holds the machine's rank and the sorted ranks of all opponent holdings,
+    so the chance to win is a binary search.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+
+    def key(self, hole, board):
+        # the showdown does not change when the suits are renamed
+        return canonical_suits(hole, board)
+
+    def lookup(self, hole, board):
+        key = self.key(hole, board)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        entry = _showdown_ranks(hole, board)
+        self._store(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        self.entries[key] = entry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)  # least recently used
+
+    def equity(self, hole, board):
+        "(win, tie) probabilities of the hole cards against every opponent holding"
+        return self._equity(*self.lookup(hole, board))
+
+    def equity_batch(self, holes, boards):
+        "equity of every (hole, board) pair, the showdowns missing from the cache are scored in one batch"
+        keys = [self.key(hole, board) for hole, board in zip(holes, boards)]
+        entries = {}
+        missing = []
+        for key, hole, board in zip(keys, holes, boards):
+            if key in entries:
+                self.hits += 1
+                continue
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                missing.append((key, hole, board))
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            entries[key] = entry
+
+        if missing:
+            _, missing_holes, missing_boards = zip(*missing)
+            for (key, _, _), entry in zip(missing, _showdown_ranks_batch(missing_holes, missing_boards)):
+                entries[key] = entry
+                self._store(key, entry)
+
+        return [self._equity(*entries[key]) for key in keys]
+
+    @staticmethod
+    def _equity(rank, opp_ranks):
+        below = int(np.searchsorted(opp_ranks, rank, side='left'))
+        up_to = int(np.searchsorted(opp_ranks, rank, side='right'))
+        return below / len(opp_ranks), (up_to - below) / len(opp_ranks)
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, len(self.entries), self.maxsize)
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+        self.entries.clear()
+
+
+# shared by every showdown during the search
+SHOWDOWN_CACHE = ShowdownCache()
+
+
+def showdown_equity(hole, board):
+    """(win, tie) probabilities of the 2 hole cards on a full 5 card board against
+    every possible opponent holding, cached in SHOWDOWN_CACHE"""
+    return SHOWDOWN_CACHE.equity(hole, board)
+
+
+def showdown_equity_batch(holes, boards):
+    "showdown_equity of every (hole, board) pair, the ones not cached are scored together"
+    return SHOWDOWN_CACHE.equity_batch(holes, boards)
+
+
+@functools.lru_cache(maxsize=1024)
+def all_in_equity_canonical(hole, board):
+    "all_in_equity for a suit-canonical (hole, board), cached"
+    missing = 5 - len(board)
+    if missing == 0:
+        return showdown_equity(hole, board)
+
+    dead = set(hole) | set(board)
+    rest = np.array([card for card in DECK if card not in dead], dtype=np.intp)
+    n = len(rest)
+
+    # machine rank for every runout, and a table from the runout's card indexes to its position
+    runouts = _index_combinations(n, missing)
+    hands = np.empty((len(runouts), 7), dtype=np.intp)
+    hands[:, :2] = hole
+    hands[:, 2:7 - missing] = board
+    hands[:, 7 - missing:] = rest[runouts]
+    mine = score_batch(hands)
+    position = np.zeros((n,) * missing, dtype=np.intp)
+    position[tuple(runouts.T)] = np.arange(len(runouts))
+
+    # the opponent's hand only depends on the set of runout + opponent cards, so every set of
+    # missing + 2 cards is scored once and compared with each way of splitting it
+    sets = _index_combinations(n, missing + 2)
+    hands = np.empty((len(sets), 7), dtype=np.intp)
+    hands[:, :5 - missing] = board
+    hands[:, 5 - missing:] = rest[sets]
+    opp = score_batch(hands)
+
+    win = tie = total = 0
+    for split in itertools.combinations(range(missing + 2), missing):
+        rank = mine[position[tuple(sets[:, split].T)]]
+        win += int(np.count_nonzero(rank > opp))
+        tie += int(np.count_nonzero(rank == opp))
+        total += len(sets)
+    return win / total, tie / total
+
+
+def all_in_equity(hole, board):
+    """(win, tie) probabilities of the 2 hole cards when the rest of the board (3 or more
+    cards known) is dealt, over every runout and every opponent holding"""
+    if len(board) < 3:
+        # before the flop every runout of 5 cards would be enumerated
+        raise ValueError(f"all_in_equity needs at least the 3 cards of the flop, got {len(board)}")
+    return all_in_equity_canonical(*canonical_suits(hole, board))
+
+
+def category_of(rank):
+    "Hand category (HIGH_CARD .. STRAIGHT_FLUSH) of a hand rank"
+    return bisect.bisect_right(_CATEGORY_START, rank) - 1
+
+
+# 5 card hands behind every rank of a category : 4 ** 5 - 4 suit choices for 5 different
+# numbers without a flush, 6 * 4 ** 3 for a pair, 6 * 6 * 4 for two pair, ... and 4 for a flush
+_CATEGORY_HANDS = [1020, 384, 144, 64, 1020, 4, 24, 4, 4]
+
+
+def _build_strength_table():
+    hands = [0] + [_CATEGORY_HANDS[category_of(rank)] for rank in range(1, ROYAL_FLUSH_RANK + 1)]
+    below = np.cumsum(hands) - hands
+    return ((below + np.array(hands) / 2) / sum(hands)).tolist()
+
+
+_STRENGTH = _build_strength_table()  # share of the 2598960 5 card hands beaten by every rank, ties count half
+
+
+def hand_strength(cards):
+    """Share of all 5 card hands beaten by the best 5 of 5 to 7 cards, ties counting half,
+    a cheap strength between 0 and 1 that does not look at the opponent"""
+    return _STRENGTH[evaluate_7(cards)]
 
 
 class CardScores:
@@ -9,14 +458,8 @@ class CardScores:
         return
 
     def build_deck(self):
-        numbers=list(range(2,15))
-        suits = ['H','S','C','D']
-        deck = []
-        for i in numbers:
-            for s in suits:
-                card = s+str(i)
-                deck.append(card)
-        return deck
+        # same order as before : 2 of every suit first, then 3, ...
+        return list(DECK)
 
     def combinations(self, arr, n):
         arr = np.asarray(arr)
@@ -79,96 +522,87 @@ class CardScores:
 
 
 
-    def score_hand(self, hand):
-        # print(hand)
-        letters = [hand[i][:1] for i in range(5)] # We get the suit for each card in the hand
-        numbers = [int(hand[i][1:]) for i in range(5)]  # We get the number for each card in the hand
-        rnum = [numbers.count(i) for i in numbers]  # We count repetitions for each number
-        rlet = [letters.count(i) for i in letters]  # We count repetitions for each letter
-        dif = max(numbers) - min(numbers) # The difference between the greater and smaller number in the hand
-        handtype = ''
-        score = 0
-        hand_with_score = ''
-        if 5 in rlet:
-            if numbers ==[14,13,12,11,10]:
-                handtype = 'royal_flush'
-                score = 135
-                hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-
-            elif dif == 4 and max(rnum) == 1:
-                handtype = 'straight_flush'
-                score = 120 + max(numbers)
-                hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-
-            elif 4 in rnum:
-                handtype == 'four of a kind'
-                score = self.check_four_of_a_kind(hand,letters,numbers,rnum,rlet)
-                hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
- 
-            elif sorted(rnum) == [2,2,3,3,3]:
-                handtype == 'full house'
-                score = self.check_full_house(hand,letters,numbers,rnum,rlet)
-                hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-
-            elif 3 in rnum:
-                handtype = 'three of a kind'
-                score = self.check_three_of_a_kind(hand,letters,numbers,rnum,rlet)
-                hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-
-            elif rnum.count(2) == 4:
-                handtype = 'two pair'
-                score = self.check_two_pair(hand,letters,numbers,rnum,rlet)
-                hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-
-            elif rnum.count(2) == 2:
-                handtype = 'pair'
-                score = self.check_pair(hand,letters,numbers,rnum,rlet)
-                hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
+    def evaluate(self, hand):
+        "Rank of the best hand in 5 to 7 cards, higher is better (see evaluate_5 and evaluate_7)"
+        if len(hand) == 5:
+            return evaluate_5(hand)
+        return evaluate_7(hand)
 
-            else:
-                handtype = 'flush'
-                score = 75 + max(numbers)/100
-                hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
- 
-        elif 4 in rnum:
-            handtype = 'four of a kind'
-            score = self.check_four_of_a_kind(hand,letters,numbers,rnum,rlet)
-            hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-
-        elif sorted(rnum) == [2,2,3,3,3]:
-            handtype = 'full house'
-            score = self.check_full_house(hand,letters,numbers,rnum,rlet)
-            hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-
-        elif 3 in rnum:
-            handtype = 'three of a kind' 
-            score = self.check_three_of_a_kind(hand,letters,numbers,rnum,rlet)
-            hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-
-        elif rnum.count(2) == 4:
-            handtype = 'two pair'
-            score = self.check_two_pair(hand,letters,numbers,rnum,rlet)
-            hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-
-        elif rnum.count(2) == 2:
-            handtype = 'pair'
-            score = self.check_pair(hand,letters,numbers,rnum,rlet)
-            hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-
-        elif dif == 4:
-            handtype = 'straight'
-            score = 65 + max(numbers)
-            hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
+    def best_hand(self, hand):
+        "(rank, best 5 cards) of 5 to 7 cards"
+        return best_hand(hand)
 
-        else:
-            handtype= 'high card'
-            n = sorted(numbers,reverse=True)
-            score = n[0] + n[1]/100 + n[2]/1000 + n[3]/10000 + n[4]/100000
-            hand_with_score = hand_with_score + handtype + ' with score : ' + str(score)
-                    
-        return score, hand_with_score
+    def score_batch(self, cards):
+        "Ranks of an (N, 5..7) array of hands, see score_batch"
+        return score_batch(cards)
+
+    def showdown_equity(self, hole, board):
+        "(win, tie) probabilities against every opponent holding, see showdown_equity"
+        return showdown_equity(hole, board)
+
+    def canonical_suits(self, *groups):
+        "Suit-canonical form of some card groups, see canonical_suits"
+        return canonical_suits(*groups)
+
+    def showdown_equity_batch(self, holes, boards):
+        "showdown_equity of every (hole, board) pair, see showdown_equity_batch"
+        return showdown_equity_batch(holes, boards)
+
+    def all_in_equity(self, hole, board):
+        "(win, tie) probabilities over every runout and opponent holding, see all_in_equity"
+        return all_in_equity(hole, board)
+
+    def hand_strength(self, cards):
+        "Share of all 5 card hands beaten by the best 5 of the cards, see hand_strength"
+        return hand_strength(cards)
 
+    def category_batch(self, ranks):
+        "Hand categories (HIGH_CARD .. STRAIGHT_FLUSH) of an array of ranks"
+        return np.searchsorted(_CATEGORY_START, ranks, side='right') - 1
 
+    def hand_category(self, rank):
+        "Name of the hand category of a rank, e.g. 'full house'"
+        if rank == ROYAL_FLUSH_RANK:
+            return 'royal_flush'
+        return CATEGORY_NAMES[category_of(rank)]
 
+    def hand_with_score(self, rank):
+        "Printable description of a rank"
+        return self.hand_category(rank) + ' with score : ' + str(rank)
 
+    def score_hand(self, hand):
+        # compatibility shim for the old float scores, the hand is classified
+        # through the lookup tables and only the old score formula is kept
+        numbers = [(hand[i] >> 2) + 2 for i in range(5)]  # We get the number for each card in the hand
+        rank = evaluate_5(hand[:5])
+        category = category_of(rank)
+        handtype = self.hand_category(rank)
+
+        if category in (STRAIGHT, STRAIGHT_FLUSH):
+            # top card of the straight, a 5 for A-2-3-4-5
+            top = 5 if sorted(numbers) == [2,3,4,5,14] else max(numbers)
 
+        if handtype == 'royal_flush':
+            score = 135
+        elif category == STRAIGHT_FLUSH:
+            score = 120 + top
+        elif category == FOUR_OF_A_KIND:
+            score = self.check_four_of_a_kind(hand,None,numbers,None,None)
+        elif category == FULL_HOUSE:
+            score = self.check_full_house(hand,None,numbers,None,None)
+        elif category == FLUSH:
+            score = 75 + max(numbers)/100
+        elif category == STRAIGHT:
+            score = 65 + top
+        elif category == THREE_OF_A_KIND:
+            score = self.check_three_of_a_kind(hand,None,numbers,None,None)
+        elif category == TWO_PAIR:
+            score = self.check_two_pair(hand,None,numbers,None,None)
+        elif category == PAIR:
+            score = self.check_pair(hand,None,numbers,None,None)
+        else:
+            n = sorted(numbers,reverse=True)
+            score = n[0] + n[1]/100 + n[2]/1000 + n[3]/10000 + n[4]/100000
+
+        hand_with_score = handtype + ' with score : ' + str(score)
+        return score, hand_with_score
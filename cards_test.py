@@ -1,178 +1,152 @@
-import pandas as pd
 import numpy as np
+import pytest
 import itertools
 import random
-
-
-
-def build_deck():
-    numbers=list(range(2,15))
-    suits = ['H','S','C','D']
-    deck = []
-    for i in numbers:
-        for s in suits:
-            card = s+str(i)
-            deck.append(card)
-    return deck
-
-def combinations(arr, n):
-    arr = np.asarray(arr)
-    t = np.dtype([('', arr.dtype)]*n)
-    result = np.fromiter(itertools.combinations(arr, n), t)
-    return result.view(arr.dtype).reshape(-1, n)
-
-def check_four_of_a_kind(hand,letters,numbers,rnum,rlet):
-    for i in numbers:
-            if numbers.count(i) == 4:
-                four = i
-            elif numbers.count(i) == 1:
-                card = i
-    score = 105 + four + card/100
-    return score
-
-def check_full_house(hand,letters,numbers,rnum,rlet):
-    for i in numbers:
-        if numbers.count(i) == 3:
-            full = i
-        elif numbers.count(i) == 2:
-            p = i
-    score = 90 + full + p/100  
-    return score
-
-def check_three_of_a_kind(hand,letters,numbers,rnum,rlet):
-    cards = []
-    for i in numbers:
-        if numbers.count(i) == 3:
-            three = i
-        else: 
-            cards.append(i)
-    score = 45 + three + max(cards) + min(cards)/1000
-    return score
-
-def check_two_pair(hand,letters,numbers,rnum,rlet):
-    pairs = []
-    cards = []
-    for i in numbers:
-        if numbers.count(i) == 2:
-            pairs.append(i)
-        elif numbers.count(i) == 1:
-            cards.append(i)
-            cards = sorted(cards,reverse=True)
-    score = 30 + max(pairs) + min(pairs)/100 + cards[0]/1000
-    return score
-
-def check_pair(hand,letters,numbers,rnum,rlet):    
-    pair = []
-    cards  = []
-    for i in numbers:
-        if numbers.count(i) == 2:
-            pair.append(i)
-        elif numbers.count(i) == 1:    
-            cards.append(i)
-            cards = sorted(cards,reverse=True)
-    score = 15 + pair[0] + cards[0]/100 + cards[1]/1000 + cards[2]/10000
-    return score
-
-
-
-
-def score_hand(hand):
-    print(hand)
-    letters = [hand[i][:1] for i in range(5)] # We get the suit for each card in the hand
-    numbers = [int(hand[i][1:]) for i in range(5)]  # We get the number for each card in the hand
-    rnum = [numbers.count(i) for i in numbers]  # We count repetitions for each number
-    rlet = [letters.count(i) for i in letters]  # We count repetitions for each letter
-    dif = max(numbers) - min(numbers) # The difference between the greater and smaller number in the hand
-    handtype = ''
-    score = 0
-    if 5 in rlet:
-        if numbers ==[14,13,12,11,10]:
-            handtype = 'royal_flush'
-            score = 135
-            print('this hand is a %s:, with score: %s' % (handtype,score)) 
-        elif dif == 4 and max(rnum) == 1:
-            handtype = 'straight_flush'
-            score = 120 + max(numbers)
-            print('this hand is a %s:, with score: %s' % (handtype,score)) 
-        elif 4 in rnum:
-            handtype == 'four of a kind'
-            score = check_four_of_a_kind(hand,letters,numbers,rnum,rlet)
-            print('this hand is a %s:, with score: %s' % (handtype,score)) 
-        elif sorted(rnum) == [2,2,3,3,3]:
-            handtype == 'full house'
-            score = check_full_house(hand,letters,numbers,rnum,rlet)
-            print('this hand is a %s:, with score: %s' % (handtype,score)) 
-        elif 3 in rnum:
-            handtype = 'three of a kind'
-            score = check_three_of_a_kind(hand,letters,numbers,rnum,rlet)
-            print('this hand is a %s:, with score: %s' % (handtype,score)) 
-        elif rnum.count(2) == 4:
-            handtype = 'two pair'
-            score = check_two_pair(hand,letters,numbers,rnum,rlet)
-            print('this hand is a %s:, with score: %s' % (handtype,score)) 
-        elif rnum.count(2) == 2:
-            handtype = 'pair'
-            score = check_pair(hand,letters,numbers,rnum,rlet)
-            print('this hand is a %s:, with score: %s' % (handtype,score)) 
-        else:
-            handtype = 'flush'
-            score = 75 + max(numbers)/100
-            print('this hand is a %s:, with score: %s' % (handtype,score)) 
-    elif 4 in rnum:
-        handtype = 'four of a kind'
-        score = check_four_of_a_kind(hand,letters,numbers,rnum,rlet)
-        print('this hand is a %s:, with score: %s' % (handtype,score)) 
-    elif sorted(rnum) == [2,2,3,3,3]:
-       handtype = 'full house'
-       score = check_full_house(hand,letters,numbers,rnum,rlet)
-       print('this hand is a %s:, with score: %s' % (handtype,score)) 
-    elif 3 in rnum:
-        handtype = 'three of a kind' 
-        score = check_three_of_a_kind(hand,letters,numbers,rnum,rlet)
-        print('this hand is a %s:, with score: %s' % (handtype,score)) 
-    elif rnum.count(2) == 4:
-        handtype = 'two pair'
-        score = check_two_pair(hand,letters,numbers,rnum,rlet)
-        print('this hand is a %s:, with score: %s' % (handtype,score)) 
-    elif rnum.count(2) == 2:
-        handtype = 'pair'
-        score = check_pair(hand,letters,numbers,rnum,rlet)
-        print('this hand is a %s:, with score: %s' % (handtype,score)) 
-    elif dif == 4:
-        handtype = 'straight'
-        score = 65 + max(numbers)
-        print('this hand is a %s:, with score: %s' % (handtype,score)) 
-
-    else:
-        handtype= 'high card'
-        n = sorted(numbers,reverse=True)
-        score = n[0] + n[1]/100 + n[2]/1000 + n[3]/10000 + n[4]/100000
-        print('this hand is a %s:, with score: %s' % (handtype,score)) 
-        
-    return score
-
-
-
-
-def handvalues(combinations):
-    scores =[{"hand": i, "value": score_hand(i)} for i in combi] # We iterate over all combinations scoring them
-    scores = sorted(scores, key = lambda k: k['value']) # We sort hands by score
-    return scores
-
-    
-deck = build_deck() # We create our deck
-print(deck)
-combi = combinations(deck,3) # We create an array containing all possible 5 cards combinations
-print(len(combi))
-print(combi[88])
-print(random.choice(combi))
-# hand_values = handvalues(combi)
-x = [i.get("hand","") for i in hand_values] # making a list of hands
-y = [i.get("value","") for i in hand_values] #making a list of values
-
-
-
-
-
-
-
+import time
+
+from cards import CardScores, DECK, ShowdownCache, all_in_equity, canonical_suits, card_from_string, evaluate_5, evaluate_7, hand_strength
+
+
+# number of 5 card hands in every category, from high card up to straight flush
+# (the 4 royal flushes are counted with the straight flushes)
+CATEGORY_COUNTS = [1302540, 1098240, 123552, 54912, 10200, 5108, 3744, 624, 40]
+
+
+def hand(*cards):
+    return [card_from_string(card) for card in cards]
+
+
+def test_all_five_card_hands():
+    # every one of the 2598960 hands in one batch
+    card_combos = CardScores()
+    combi = card_combos.combinations(list(DECK), 5)
+    ranks = card_combos.score_batch(combi)
+
+    assert len(ranks) == 2598960
+    assert np.bincount(card_combos.category_batch(ranks)).tolist() == CATEGORY_COUNTS
+    assert len(np.unique(ranks)) == 7462
+
+    # the batch agrees with the one hand evaluator
+    sample = range(0, len(combi), 997)
+    assert [evaluate_5(combi[i].tolist()) for i in sample] == ranks[sample].tolist()
+
+    # the strength of a rank is the share of hands it beats, ties counting half
+    counts = np.bincount(ranks)
+    strength = (np.cumsum(counts) - counts / 2) / len(ranks)
+    assert np.allclose([hand_strength(combi[i].tolist()) for i in sample], strength[ranks[sample]])
+
+
+def test_batch_matches_seven_card_evaluator():
+    card_combos = CardScores()
+    random.seed(0)
+    for n in (6, 7):
+        hands = np.array([random.sample(DECK, n) for _ in range(2000)])
+        ranks = card_combos.score_batch(hands)
+
+        for cards, rank in zip(hands.tolist(), ranks.tolist()):
+            assert rank == evaluate_7(cards)
+            assert rank == max(evaluate_5(c) for c in itertools.combinations(cards, 5))
+
+
+def test_hand_order():
+    card_combos = CardScores()
+    hands = [
+        hand('H7', 'S5', 'C4', 'D3', 'H2'),
+        hand('H2', 'S2', 'C4', 'D3', 'H5'),
+        hand('H14', 'S2', 'C3', 'D4', 'H5'),  # wheel, the lowest straight
+        hand('H6', 'S2', 'C3', 'D4', 'H5'),
+        hand('H2', 'H9', 'H4', 'H11', 'H5'),
+        hand('H3', 'S3', 'C3', 'D2', 'H2'),
+        hand('H2', 'S2', 'C2', 'D2', 'H14'),
+        hand('S14', 'S2', 'S3', 'S4', 'S5'),
+        hand('H14', 'H13', 'H12', 'H11', 'H10'),
+    ]
+    ranks = [card_combos.evaluate(h) for h in hands]
+    assert ranks == sorted(ranks)
+    assert ranks[0] == 1 and ranks[-1] == 7462
+    assert card_combos.hand_category(ranks[-1]) == 'royal_flush'
+    assert card_combos.score_hand(hands[-1])[0] == 135
+
+    rank, best = card_combos.best_hand(hand('H14', 'H13', 'S2', 'H12', 'C2', 'H11', 'H10'))
+    assert rank == 7462 and sorted(best) == sorted(hand('H14', 'H13', 'H12', 'H11', 'H10'))
+
+
+def test_showdown_cache():
+    hole = hand('H14', 'S14')
+    board = hand('D2', 'C7', 'H9', 'S11', 'D13')
+    rest = [card for card in DECK if card not in hole + board]
+
+    mine = evaluate_7(hole + board)
+    opp = [evaluate_7([a, b] + board) for a, b in itertools.combinations(rest, 2)]
+    assert len(opp) == 990
+
+    cache = ShowdownCache(maxsize=2)
+    win, tie = cache.equity(hole, board)
+    assert win == sum(r < mine for r in opp) / 990
+    assert tie == sum(r == mine for r in opp) / 990
+
+    # same cards in another order hit the cache, the oldest entry is dropped when full
+    assert cache.equity(hole[::-1], board[::-1]) == (win, tie)
+    cache.equity(hand('H2', 'S3'), board)
+    cache.equity(hand('H4', 'S3'), board)
+    assert cache.cache_info() == (1, 3, 2, 2)
+
+    # a batch scores the showdowns it does not find together, and agrees with one at a time
+    random.seed(2)
+    deals = [random.sample(DECK, 7) for _ in range(20)]
+    holes, boards = [deal[:2] for deal in deals], [deal[2:] for deal in deals]
+    batch = ShowdownCache(maxsize=8)
+    assert batch.equity_batch(holes + holes[:3], boards + boards[:3]) == [ShowdownCache().equity(*deal) for deal in zip(holes + holes[:3], boards + boards[:3])]
+    assert batch.cache_info() == (3, 20, 8, 8)
+
+
+def test_all_in_equity():
+    # all in on the turn : every river card against every opponent holding
+    hole = hand('H14', 'S14')
+    board = hand('D2', 'C7', 'H9', 'S11')
+    rest = [card for card in DECK if card not in hole + board]
+
+    win = tie = total = 0
+    for river in rest:
+        mine = evaluate_7(hole + board + [river])
+        for a, b in itertools.combinations([card for card in rest if card != river], 2):
+            opp = evaluate_7([a, b, river] + board)
+            win += mine > opp
+            tie += mine == opp
+            total += 1
+    assert total == 46 * 990
+    assert all_in_equity(hole, board) == (win / total, tie / total)
+
+    # on the river nothing is left to deal
+    river = board + hand('D13')
+    assert all_in_equity(hole, river) == ShowdownCache().equity(hole, river)
+
+    # on the flop, the 6 ways of splitting 4 cards into runout and opponent cards add up
+    win, tie = all_in_equity(hole, board[:3])
+    assert 0.8 < win < 0.9 and 0 < tie < 0.01
+
+    # before the flop there are too many runouts to enumerate
+    with pytest.raises(ValueError):
+        all_in_equity(hole, board[:2])
+
+
+def test_canonical_suits():
+    random.seed(1)
+    for _ in range(1000):
+        cards = random.sample(DECK, 9)
+        groups = cards[:2], cards[2:2 + random.randint(0, 5)], cards[7:]
+        suits = random.sample(range(4), 4)
+        renamed = [[(card & ~3) | suits[card & 3] for card in group] for group in groups]
+        assert canonical_suits(*renamed) == canonical_suits(*groups)
+
+    # pocket aces on a flop of one suit : the two other suits are interchangeable
+    flop = hand('D2', 'D7', 'D9')
+    assert canonical_suits(hand('H14', 'S14'), flop) == canonical_suits(hand('C14', 'S14'), flop)
+    assert canonical_suits(hand('H14', 'S14'), flop) != canonical_suits(hand('D14', 'S14'), flop)
+
+
+if __name__ == "__main__":
+    for test in (test_all_five_card_hands, test_batch_matches_seven_card_evaluator, test_hand_order, test_showdown_cache, test_all_in_equity, test_canonical_suits):
+        start = time.time()
+        test()
+        print(test.__name__, 'ok', round(time.time() - start, 2), 's')
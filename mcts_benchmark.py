@@ -0,0 +1,281 @@
+"""
+Benchmarks of the Monte Carlo tree search on the poker and tic-tac-toe boards
+
+    python mcts_benchmark.py            # every benchmark
+    python mcts_benchmark.py parallel   # only the named ones
+"""
+import contextlib
+import io
+import random
+import sys
+import time
+
+from cards import CardScores, all_in_equity, all_in_equity_canonical
+from monte_carlo_tree_search import MCTS, ArrayMCTS, NegamaxBackup, NormalizedBackup, WinRateBackup
+from mcts_parallel import RootParallelMCTS, TreeParallelMCTS
+import poker_mcts
+import tic_tac_toe
+
+
+STACK = 30  # chips of each player when the hands of flop_board started
+EXPLORATION = poker_mcts.EXPLORATION  # exploration weight with the rewards in [-1, 1]
+
+
+def flop_board(seed):
+    "Machine to act on the flop, both players checked the first round, suit-canonical"
+    random.seed(seed)
+    board = poker_mcts.new_poker_board().assign_cards(CardScores().build_deck())
+    for index in (2, 3, 4):
+        board = board.assign_cards_to_middle(index)
+    board = poker_mcts.PokerBoard(board.tup, True, None, False, 25, 10, 25, False, False, False, False, 5, 5, None)
+    return board.canonical()
+
+
+def boards():
+    return [("poker", flop_board(0)), ("tic-tac-toe", tic_tac_toe.new_tic_tac_toe_board())]
+
+
+def bench_parallel(seconds=2, workers=(1, 2, 4, 8)):
+    "Rollouts per second of the root-parallel and tree-parallel searches"
+    print("parallel search, rollouts/sec in", seconds, "s")
+    print(f"{'board':<12} {'mode':<6}" + "".join(f"{w:>10}" for w in workers))
+    for name, board in boards():
+        for mode, searcher in (("root", RootParallelMCTS), ("tree", TreeParallelMCTS)):
+            rates = []
+            for w in workers:
+                tree = searcher(workers=w, seed=0)
+                # tic_tac_toe prints every random board of its simulations
+                with contextlib.redirect_stdout(io.StringIO()):
+                    tree.search(board, deadline=time.monotonic() + seconds)
+                if mode == "root":
+                    tree.close()
+                rates.append(tree.last_search.rollouts / tree.last_search.elapsed)
+            print(f"{name:<12} {mode:<6}" + "".join(f"{rate:>10.0f}" for rate in rates))
+
+
+class SetDifferenceMCTS(MCTS):
+    "MCTS finding unexplored children with a set difference at every level, as _select used to"
+
+    def _select(self, node):
+        path = []
+        while True:
+            path.append(node)
+            if node in self.draws:
+                node = self._sample_chance(node)
+                if node not in self.children:
+                    path.append(node)
+                    return path
+                continue
+            if node not in self.children or not self.children[node]:
+                return path
+            unexplored = self.children[node] - self.children.keys()
+            if unexplored:
+                path.append(unexplored.pop())
+                return path
+            node = self._uct_select(node)
+
+
+def timed_select(tree):
+    "Wrap tree._select to add up the seconds spent in it, in the returned list"
+    select = tree._select
+    spent = [0.0]
+
+    def timed(node):
+        start = time.perf_counter()
+        path = select(node)
+        spent[0] += time.perf_counter() - start
+        return path
+
+    tree._select = timed
+    return spent
+
+
+def bench_select(rollouts=3000, boards=10):
+    "Time spent in _select with untried-children lists against set differences, on deep poker trees"
+    # every all-in runout (1081 children) and every turn / river card (about 45) as children
+    exact_showdown = poker_mcts.EXACT_SHOWDOWN
+    poker_mcts.EXACT_SHOWDOWN = False
+    try:
+        # only the time in _select compares, the trees grow apart as the untried children are not
+        # tried in the same order
+        print("_select on", boards, "poker trees of", rollouts, "rollouts, fully expanded chance nodes")
+        for searcher in (SetDifferenceMCTS, MCTS):
+            spent = 0.0
+            for seed in range(boards):
+                board = flop_board(seed)
+                tree = searcher(widening=None)
+                select = timed_select(tree)
+                random.seed(seed)
+                tree.search(board, max_rollouts=rollouts)
+                spent += select[0]
+            print(f"{searcher.__name__:<18} _select {spent:6.2f} s   {1e6 * spent / (rollouts * boards):7.1f} us per rollout")
+    finally:
+        poker_mcts.EXACT_SHOWDOWN = exact_showdown
+
+
+def settled_choices(tree, board, checkpoints):
+    "Grow the tree from board up to every number of rollouts in checkpoints, the choice at each"
+    choices, done = [], 0
+    for rollouts in checkpoints:
+        tree.search(board, max_rollouts=rollouts - done)
+        done = rollouts
+        choices.append(tree.choose(board))
+    return choices
+
+
+def facing_raise_board(seed):
+    "flop_board after the opponent raised 10, the machine can only call or fold"
+    return flop_board(seed)._replace(raised_opp=True, raised_money_opp=10, money_opp=15, money_middle=20)
+
+
+def pot_odds_move(board):
+    "Call when the all in equity pays for the call out of the pot after it, else fold (the betting to come left out)"
+    win, tie = all_in_equity(board.tup[0:2], [card for card in board.tup[2:7] if card is not None])
+    call = board.raised_money_opp - board.raised_money_ma
+    if win + tie / 2 > call / (board.money_middle + call):
+        return board.make_move('R', call)
+    return board.make_move('F', 0)
+
+
+def convergence(name, new_tree, boards, checkpoints, runs, reference=None):
+    """Print how often trees from new_tree() choose the move most runs end on after every number of rollouts
+    in checkpoints, after how many rollouts their choice stops changing, the us per rollout and how often
+    the last choice is reference(board)"""
+    agree = [0] * len(checkpoints)
+    settled = elapsed = right = 0
+    for seed, board in enumerate(boards):
+        ends = []
+        for run in range(runs):
+            random.seed(1000 * seed + run)
+            start = time.perf_counter()
+            ends.append(settled_choices(new_tree(), board, checkpoints))
+            elapsed += time.perf_counter() - start
+        final = max(set(choices[-1] for choices in ends), key=[choices[-1] for choices in ends].count)
+        for choices in ends:
+            for k, choice in enumerate(choices):
+                agree[k] += choice == final
+            # first checkpoint from which the choice does not change any more
+            k = len(choices) - 1
+            while k and choices[k - 1] == choices[-1]:
+                k -= 1
+            settled += checkpoints[k]
+            right += reference is not None and choices[-1] == reference(board)
+    total = runs * len(boards)
+    print(f"{name:<28}" + "".join(f"{a / total:>7.2f}" for a in agree)
+          + f"   {settled / total:>13.0f}   {1e6 * elapsed / (total * checkpoints[-1]):>10.0f}"
+          + (f"   {right / total:>8.2f}" if reference else ""))
+
+
+def convergence_header(title, boards, checkpoints, runs, reference=None):
+    print(title + ", share of", runs, "runs on", boards, "choosing the move most runs end on")
+    print(f"{'':<28}" + "".join(f"{n:>7}" for n in checkpoints) + "   settled after   us/rollout"
+          + ("   pot odds" if reference else ""))
+
+
+def bench_policy(checkpoints=(25, 50, 100, 200, 400, 800), runs=8, boards=5):
+    "How many rollouts the uniform and the hand strength rollout policies take to settle on a choice"
+    convergence_header("rollout policy", f"{boards} flop boards", checkpoints, runs)
+    for name, policy in (("uniform", None), ("hand_strength_rollout", poker_mcts.hand_strength_rollout)):
+        convergence(name, lambda: MCTS(EXPLORATION, rollout_policy=policy, backup=NormalizedBackup(STACK)),
+                    [flop_board(seed) for seed in range(boards)], checkpoints, runs)
+
+
+def bench_backup(checkpoints=(25, 50, 100, 200, 400, 800, 1600), runs=4, boards=12):
+    "How many rollouts every backup scheme takes to settle on calling or folding a raise, and how often it follows the pot odds"
+    convergence_header("backup", f"{boards} flop boards facing a raise", checkpoints, runs, pot_odds_move)
+    schemes = (("win rate, weight 20", WinRateBackup(), 20),
+               ("negamax chips, weight 20", NegamaxBackup(), 20),
+               ("negamax chips, scaled", NegamaxBackup(STACK), EXPLORATION),
+               ("normalized by the stack", NormalizedBackup(STACK), EXPLORATION))
+    for name, backup, weight in schemes:
+        convergence(name, lambda: MCTS(weight, backup=backup),
+                    [facing_raise_board(seed) for seed in range(boards)], checkpoints, runs, pot_odds_move)
+
+
+def bench_early_stop(max_rollouts=300, boards=12, runs=2):
+    "Rollouts used and choices kept when search stops early, against max_rollouts every time"
+    positions = [flop_board(seed) for seed in range(boards)] + [facing_raise_board(seed) for seed in range(boards)]
+    print("early stops on", len(positions), "flop boards (half facing a raise),", runs, "runs, at most", max_rollouts, "rollouts")
+    print(f"{'stop':<28} {'rollouts':>9} {'saved':>7} {'same move':>10}   stop reasons")
+    full = []
+    for seed, board in enumerate(positions):
+        for run in range(runs):
+            random.seed(1000 * seed + run)
+            full.append(poker_mcts.new_search_tree().search(board, max_rollouts=max_rollouts))
+    for name, stops in (("confidence 0.95", dict(confidence=0.95)), ("confidence 0.99", dict(confidence=0.99)),
+                        ("stable 100", dict(stable=100)), ("stable 200", dict(stable=200))):
+        rollouts = same = 0
+        reasons = {}
+        for k, board in enumerate([board for board in positions for _ in range(runs)]):
+            random.seed(1000 * (k // runs) + k % runs)
+            tree = poker_mcts.new_search_tree()
+            same += tree.search(board, max_rollouts=max_rollouts, **stops) == full[k]
+            rollouts += tree.last_search.rollouts
+            reasons[tree.last_search.stop_reason] = reasons.get(tree.last_search.stop_reason, 0) + 1
+        total = len(full)
+        print(f"{name:<28} {rollouts / total:>9.0f} {1 - rollouts / (total * max_rollouts):>7.0%} {same / total:>10.2f}   {reasons}")
+
+
+def past_flop(board):
+    return board.street() > 3
+
+
+def bench_truncate(boards=5, starts=200, repeats=5):
+    "Cost of a simulation from flop positions played to the end or truncated and estimated by equity"
+    random.seed(0)
+    nodes = []
+    for seed in range(boards):
+        for _ in range(starts):
+            node = flop_board(seed)
+            if random.random() < 0.5:
+                node = node.find_random_child()
+            if not node.is_terminal():
+                nodes.append(node)
+    print("simulations from", len(nodes), "flop positions, us per simulation, cold then warm equity cache")
+    for name, truncate in (("to the end", None), ("until the turn", past_flop), ("2 moves", 2), ("none, estimate", 0)):
+        simulate = MCTS(truncate=truncate)._simulate
+        all_in_equity_canonical.cache_clear()
+        times = []
+        for _ in ("cold", "warm"):
+            random.seed(1)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                for node in nodes:
+                    simulate(node)
+            times.append(1e6 * (time.perf_counter() - start) / (repeats * len(nodes)))
+        print(f"{name:<16} {times[0]:>6.0f} {times[1]:>6.0f}")
+
+
+def bench_stats(rollouts=1000, boards=5):
+    "Where the time of a search goes, from the SearchStats of instrumented trees"
+    print("instrumented searches of", rollouts, "rollouts on", boards, "flop boards, share of the rollout time per phase")
+    phases = ("select", "expand", "simulate", "backpropagate")
+    print(f"{'tree':<10} {'rollouts/s':>10}" + "".join(f"{phase:>14}" for phase in phases)
+          + f" {'depth':>6} {'branching':>10} {'nodes':>6}   cache hit rates")
+    for searcher in (MCTS, ArrayMCTS):
+        for seed in range(boards):
+            random.seed(seed)
+            tree = poker_mcts.new_search_tree(searcher, instrument=True)
+            tree.search(flop_board(seed), max_rollouts=rollouts)
+            stats = tree.stats
+            rates = {name: round(rate, 2) for name, rate in stats.cache_hit_rates.items() if rate is not None}
+            print(f"{searcher.__name__:<10} {stats.rollouts_per_sec:>10.0f}"
+                  + "".join(f"{stats.phase_seconds[phase] / stats.elapsed:>14.0%}" for phase in phases)
+                  + f" {stats.mean_depth:>6.1f} {stats.branching:>10.1f} {stats.nodes:>6}   {rates}")
+
+
+BENCHMARKS = {
+    "parallel": bench_parallel,
+    "policy": bench_policy,
+    "backup": bench_backup,
+    "early_stop": bench_early_stop,
+    "select": bench_select,
+    "truncate": bench_truncate,
+    "stats": bench_stats,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
+        print()
@@ -0,0 +1,277 @@
+"""
+Parallel Monte Carlo tree search over a pool of processes
+
+Root parallelism : every worker grows its own tree from the same root with its own
+random seed, the statistics of the root children are summed before choosing.
+
+Tree parallelism : the workers grow one tree whose statistics are arrays in shared
+memory, a virtual loss on the nodes being searched spreads them over different paths.
+"""
+from collections import defaultdict
+from multiprocessing import shared_memory
+import math
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from monte_carlo_tree_search import MCTS, SearchReport
+
+
+class RootParallelMCTS:
+    "Root-parallel searcher. Rollout independent trees in worker processes then choose a move."
+
+    def __init__(self, workers=None, tree_class=MCTS, seed=None, **tree_args):
+        self.workers = workers or os.cpu_count()
+        self.tree_class = tree_class
+        self.tree_args = tree_args  # passed to tree_class in every worker
+        self.seeds = random.Random(seed)
+        self.Q = defaultdict(int)  # total reward of each root child, summed over the workers
+        self.N = defaultdict(int)  # total visit count of each root child, summed over the workers
+        self.last_search = None  # SearchReport of the last search, all workers together
+        self.worker_searches = []  # SearchReport of every worker in the last search
+        self._pool = None
+
+    def search(self, node, deadline=None, max_rollouts=None, confidence=None, stable=None):
+        """Search from node in every worker until `deadline` (a time.monotonic() value, the clock
+        is shared by the processes) or until `max_rollouts` rollouts in total, then choose.
+        `confidence` and `stable` stop every worker early on its own tree, as in MCTS.search ; there
+        is no `cancel` event, a threading.Event does not reach the worker processes"""
+        if deadline is None and max_rollouts is None:
+            raise ValueError("search needs a deadline or max_rollouts to stop")
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers)
+
+        start = time.monotonic()
+        seed = self.seeds.randrange(2 ** 32)
+        # max_rollouts split exactly, the first workers doing one more, no job for the other workers left
+        # without any as a search does at least one rollout
+        shares = [None if max_rollouts is None else max_rollouts // self.workers + (k < max_rollouts % self.workers)
+                  for k in range(self.workers)]
+        jobs = [(self.tree_class, self.tree_args, node, deadline, share, (seed + k) % 2 ** 32, confidence, stable)
+                for k, share in enumerate(shares) if share != 0 or k == 0]
+        results = self._pool.map(_search_worker, jobs)
+
+        self.Q = defaultdict(int)
+        self.N = defaultdict(int)
+        for children, report in results:
+            for child, q, n in children:
+                self.Q[child] += q
+                self.N[child] += n
+        self.worker_searches = [report for _, report in results]
+        reasons = {report.stop_reason for report in self.worker_searches}
+        self.last_search = SearchReport(sum(report.rollouts for report in self.worker_searches),
+                                        time.monotonic() - start,
+                                        "deadline" if "deadline" in reasons else reasons.pop())
+        return self.choose(node)
+
+    def choose(self, node):
+        "Choose the root child with the best average reward over all the workers"
+        if node.is_terminal():
+            raise RuntimeError(f"choose called on terminal node {node}")
+        if not self.N:
+            return node.find_random_child()
+        return max(self.N, key=lambda n: self.Q[n] / self.N[n] if self.N[n] else float("-inf"))
+
+    def close(self):
+        "Stop the worker processes"
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _search_worker(job):
+    "Search from the root in a fresh tree, returns (child, Q, N) of the root children and the SearchReport"
+    tree_class, tree_args, node, deadline, max_rollouts, seed, confidence, stable = job
+    random.seed(seed)
+    np.random.seed(seed)
+    tree = tree_class(**tree_args)
+    tree.search(node, deadline=deadline, max_rollouts=max_rollouts, confidence=confidence, stable=stable)
+    return tree.child_stats(node), tree.last_search
+
+
+class TreeParallelMCTS:
+    """
+    Tree-parallel searcher. Worker processes rollout one shared tree then choose a move.
+
+    Nodes are numbered in shared memory : the children of a node are the ids first .. first + count - 1,
+    in the order of sorted(node.find_children(), key=repr) so that every worker can rebuild them,
+    which needs find_children to give the same nodes on every call (see Node.has_random_children).
+    Chance nodes are expanded fully (no progressive widening), and nodes are no longer expanded
+    once `capacity` ids are used.
+    """
+
+    def __init__(self, workers=None, exploration_weight=20, virtual_loss=1, capacity=1 << 16, seed=None, rollout_policy=None, truncate=None, backup=None):
+        self.workers = workers or os.cpu_count()
+        self.exploration_weight = exploration_weight
+        self.rollout_policy = rollout_policy  # as in MCTS, a module level function so that the workers can load it
+        self.truncate = truncate  # as in MCTS
+        self.backup = backup  # as in MCTS
+        # visits added to the nodes being searched, each with the backup's loss as reward, so that the
+        # other workers look elsewhere
+        self.virtual_loss = virtual_loss
+        self.capacity = capacity
+        self.seeds = random.Random(seed)
+        self.Q = dict()  # total reward of each root child in the last search
+        self.N = dict()  # total visit count of each root child in the last search
+        self.nodes_used = 0  # ids used by the last search
+        self.last_search = None  # SearchReport of the last search, all workers together
+        self.worker_rollouts = []  # rollouts done by every worker in the last search
+
+    def search(self, node, deadline=None, max_rollouts=None):
+        """Search from node in every worker until `deadline` (a time.monotonic() value) or until
+        `max_rollouts` rollouts in total, then choose"""
+        if deadline is None and max_rollouts is None:
+            raise ValueError("search needs a deadline or max_rollouts to stop")
+        if node.has_random_children():
+            # the workers would give the same id to different children, and add up unrelated statistics
+            raise ValueError(f"TreeParallelMCTS needs the same find_children in every worker, {type(node).__name__} draws them at random")
+
+        start = time.monotonic()
+        shm = shared_memory.SharedMemory(create=True, size=_SharedTree.size(self.capacity, self.workers))
+        try:
+            tree = _SharedTree(shm.buf, self.capacity, self.workers)
+            tree.init()
+            lock = multiprocessing.Lock()
+            seed = self.seeds.randrange(2 ** 32)
+            processes = [multiprocessing.Process(target=_tree_worker, args=(
+                shm.name, self.capacity, self.workers, k, lock, node, deadline, max_rollouts, (seed + k) % 2 ** 32,
+                self.exploration_weight, self.virtual_loss, self.rollout_policy, self.truncate, self.backup)) for k in range(self.workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            children = sorted(node.find_children(), key=repr) if tree.first[0] != -1 else []
+            first = tree.first[0]
+            self.Q = {child: float(tree.Q[first + j]) for j, child in enumerate(children)}
+            self.N = {child: int(tree.N[first + j]) for j, child in enumerate(children)}
+            self.nodes_used = int(tree.header[_NEXT_ID])
+            self.worker_rollouts = tree.rollouts.tolist()
+            del tree  # the views must go before the memory is closed
+        finally:
+            shm.close()
+            shm.unlink()
+
+        stop_reason = "max_rollouts" if max_rollouts is not None and sum(self.worker_rollouts) >= max_rollouts else "deadline"
+        self.last_search = SearchReport(sum(self.worker_rollouts), time.monotonic() - start, stop_reason)
+        return self.choose(node)
+
+    def choose(self, node):
+        "Choose the root child with the best average reward"
+        if node.is_terminal():
+            raise RuntimeError(f"choose called on terminal node {node}")
+        if not self.N:
+            return node.find_random_child()
+        return max(self.N, key=lambda n: self.Q[n] / self.N[n] if self.N[n] else float("-inf"))
+
+
+_NEXT_ID, _STARTED = 0, 1  # header fields : ids used, rollouts started
+
+
+class _SharedTree:
+    "Views of the tree arrays in a shared memory buffer"
+
+    FIELDS = (("Q", np.float64), ("N", np.int64), ("VL", np.int64), ("first", np.int64), ("count", np.int64))
+
+    @classmethod
+    def size(cls, capacity, workers):
+        return 8 * (len(cls.FIELDS) * capacity + 2 + workers)
+
+    def __init__(self, buf, capacity, workers):
+        offset = 0
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.ndarray((capacity,), dtype=dtype, buffer=buf, offset=offset))
+            offset += 8 * capacity
+        self.header = np.ndarray((2,), dtype=np.int64, buffer=buf, offset=offset)
+        self.rollouts = np.ndarray((workers,), dtype=np.int64, buffer=buf, offset=offset + 16)
+
+    def init(self):
+        for name, _ in self.FIELDS:
+            getattr(self, name)[:] = 0
+        self.first[:] = -1  # not expanded
+        self.header[:] = 0
+        self.header[_NEXT_ID] = 1  # id 0 is the root
+        self.rollouts[:] = 0
+
+
+def _tree_worker(name, capacity, workers, k, lock, root, deadline, max_rollouts, seed, exploration_weight, virtual_loss, rollout_policy, truncate, backup):
+    "Rollout the shared tree until the deadline or until max_rollouts have been started by all workers"
+    random.seed(seed)
+    np.random.seed(seed)
+    shm = shared_memory.SharedMemory(name=name)
+    tree = _SharedTree(shm.buf, capacity, workers)
+    searcher = MCTS(exploration_weight, rollout_policy=rollout_policy, truncate=truncate, backup=backup)
+    exploration_weight *= searcher.backup.exploration_scale
+    loss = virtual_loss * searcher.backup.loss
+    nodes = {0: root}  # nodes of the ids seen by this worker
+
+    while deadline is None or time.monotonic() < deadline:
+        path = _select(tree, nodes, exploration_weight)
+        leaf = path[-1]
+        children = sorted(nodes[leaf].find_children(), key=repr) if tree.first[leaf] == -1 else None
+
+        with lock:
+            if max_rollouts is not None and tree.header[_STARTED] >= max_rollouts:
+                break
+            tree.header[_STARTED] += 1
+            _virtual_loss(tree, path, virtual_loss, loss)
+            if children is not None and tree.first[leaf] == -1 and tree.header[_NEXT_ID] + len(children) <= capacity:
+                first = tree.header[_NEXT_ID]
+                tree.header[_NEXT_ID] += len(children)
+                tree.count[leaf] = len(children)
+                tree.first[leaf] = first  # last, the readers take first != -1 as expanded
+                for j, child in enumerate(children):
+                    nodes[first + j] = child
+
+        reward = searcher._simulate(nodes[leaf])
+
+        rewards = searcher._path_rewards([nodes[i] for i in path], reward, 1)
+        with lock:
+            tree.N[path] += 1
+            tree.Q[path] += rewards
+            _virtual_loss(tree, path, -virtual_loss, -loss)
+            tree.rollouts[k] += 1
+
+    del tree
+    shm.close()
+
+
+def _virtual_loss(tree, path, visits, reward):
+    "Add visits and their reward (the backup's loss) to the nodes of path being searched, or take them back"
+    tree.VL[path] += visits
+    tree.Q[path] += reward
+
+
+def _select(tree, nodes, exploration_weight):
+    "Path of ids from the root to an unexplored or terminal node, counting virtual losses as lost visits"
+    path = [0]
+    i = 0
+    while True:
+        first = tree.first[i]
+        count = tree.count[i]
+        if first == -1 or count == 0:
+            # node is either unexplored or terminal
+            return path
+        if first not in nodes:
+            # expanded by another worker
+            for j, child in enumerate(sorted(nodes[i].find_children(), key=repr)):
+                nodes[first + j] = child
+        n = tree.N[first:first + count] + tree.VL[first:first + count]
+        j = n.argmin()
+        if n[j] == 0:
+            path.append(first + j)
+            return path
+        log_N_vertex = math.log(tree.N[i] + tree.VL[i])
+        uct = tree.Q[first:first + count] / n + exploration_weight * np.sqrt(log_N_vertex / n)
+        i = first + uct.argmax()
+        path.append(i)
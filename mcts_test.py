@@ -0,0 +1,356 @@
+import random
+import threading
+import time
+
+import pytest
+
+from cards import all_in_equity, card_from_string
+from mcts_parallel import RootParallelMCTS, TreeParallelMCTS, _SharedTree, _select, _virtual_loss
+from monte_carlo_tree_search import ArrayMCTS, ISMCTS, MCTS, NormalizedBackup
+import poker_mcts
+from poker_mcts import EXPLORATION, PokerBoard, hand_strength_rollout, new_poker_board, new_search_tree
+from poker_tournament import Engine, play_match, seat_view, tournament
+from tic_tac_toe import new_tic_tac_toe_board
+
+
+def hand(*cards):
+    return tuple(card_from_string(card) for card in cards)
+
+
+def quads_on_the_flop():
+    "Betting closed on the flop, the opponent to act on the turn, the machine has four aces"
+    tup = hand('H14', 'S14', 'D14', 'C14', 'H13') + (None,) * 4
+    return PokerBoard(tup, False, None, False, 15, 10, 15, False, True, False, True, 5, 5, None).canonical()
+
+
+def facing_raise(*cards):
+    "The opponent raised 10 on a flop of A K Q, the machine holds cards and can call or fold"
+    tup = hand(*cards, 'S14', 'D13', 'C12') + (None,) * 4
+    return PokerBoard(tup, True, None, False, 15, 20, 5, True, False, False, False, 15, 5, None).canonical()
+
+
+def flop():
+    "Both players checked the first round, the machine to act on the flop"
+    tup = hand('H10', 'S9', 'D2', 'C7', 'H13') + (None,) * 4
+    return PokerBoard(tup, True, None, False, 15, 10, 15, False, False, False, False, 5, 5, None).canonical()
+
+
+def parallel_args():
+    return dict(exploration_weight=EXPLORATION, backup=NormalizedBackup(new_poker_board().money_machine))
+
+
+def test_reward_side_across_chance_nodes():
+    board = quads_on_the_flop()
+    assert board.is_chance()
+
+    # dealing the turn card is not a move, the player to act stays the same
+    assert {child.turn for child in board.find_children()} == {board.turn}
+    assert board.find_random_child().turn == board.turn
+
+    # the chance node is worth as much to the machine, which moved into it, with sampled
+    # (widened) and with fully expanded deals
+    for widening in ((1, 0.5), None):
+        random.seed(0)
+        tree = new_search_tree(widening=widening)
+        tree.search(board, max_rollouts=300)
+        assert tree.Q[board] / tree.N[board] > 0.3
+
+
+def test_opponent_estimate_plays_the_opponents_cards(monkeypatch, capsys):
+    # the machine raised 10 on the flop, the opponent's cards are unknown to it
+    board = PokerBoard(hand('D9', 'C9', 'S14', 'D13', 'C12') + (None,) * 4, False, None, False, 5, 20, 15, False, False, True, False, 5, 15, None)
+    opponent_board = board.mirrored()
+    assert opponent_board.turn and opponent_board.mirrored() == board
+
+    # with every determinization dealing the opponent trip aces it calls, with 7 2 it folds
+    for cards, folded in ((hand('H14', 'C14'), None), (hand('H7', 'S2'), 'opp')):
+        monkeypatch.setattr(PokerBoard, 'determinize', lambda board: board._replace(tup=cards + board.tup[2:9]))
+        random.seed(0)
+        tree = new_search_tree(ISMCTS)
+        tree.search(opponent_board, max_rollouts=300)
+        assert tree.choose(opponent_board).mirrored().folded == folded
+    monkeypatch.undo()
+
+    # the real determinizations deal around the cards seen, quietly
+    random.seed(1)
+    for _ in range(100):
+        state = opponent_board.determinize()
+        assert len(set(state.tup) - {None}) == 7 and state.tup[2:9] == opponent_board.tup[2:9]
+    new_search_tree(ISMCTS).search(opponent_board, max_rollouts=100)
+    assert capsys.readouterr().out == ''
+
+
+def test_root_parallel_search():
+    # the workers share max_rollouts exactly and choose the move MCTS chooses : fold 7 2, call with trip aces
+    for cards in (('H7', 'S2'), ('H14', 'C14')):
+        board = facing_raise(*cards)
+        random.seed(0)
+        move = new_search_tree().search(board, max_rollouts=200)
+        tree = RootParallelMCTS(workers=3, seed=0, **parallel_args())
+        try:
+            assert tree.search(board, max_rollouts=200) == move
+        finally:
+            tree.close()
+        assert tree.last_search.rollouts == 200
+
+    # fewer rollouts than workers, seeds at the end of the seed range and the early stop of every worker
+    tree = RootParallelMCTS(workers=3, seed=0, **parallel_args())
+    tree.seeds.randrange = lambda n: n - 1
+    try:
+        tree.search(facing_raise('H7', 'S2'), max_rollouts=2)
+        assert tree.last_search.rollouts == 2 and len(tree.worker_searches) == 2
+        assert tree.search(facing_raise('H7', 'S2'), max_rollouts=1500, confidence=0.95).folded == 'ma'
+        assert tree.last_search.stop_reason == 'confident' and tree.last_search.rollouts < 1500
+    finally:
+        tree.close()
+
+
+def test_tree_parallel_search():
+    # the workers grow one tree with fully expanded chance nodes, and choose the move MCTS chooses
+    for cards in (('H7', 'S2'), ('H14', 'C14')):
+        board = facing_raise(*cards)
+        random.seed(0)
+        move = new_search_tree().search(board, max_rollouts=200)
+        tree = TreeParallelMCTS(workers=2, seed=0, **parallel_args())
+        tree.seeds.randrange = lambda n: n - 1  # the worker seeds wrap around 2 ** 32
+        assert tree.search(board, max_rollouts=200) == move
+        assert tree.last_search.rollouts == 200
+
+
+def test_tree_parallel_virtual_loss_spreads_the_workers(monkeypatch):
+    # two children of the root equally bad for the machine
+    board = facing_raise('H7', 'S2')
+    children = sorted(board.find_children(), key=repr)
+    tree = _SharedTree(bytearray(_SharedTree.size(8, 2)), 8, 2)
+    tree.init()
+    tree.first[0], tree.count[0], tree.header[0] = 1, 2, 3
+    tree.N[0:3] = 2000, 1000, 1000
+    tree.Q[1:3] = -400, -400  # normalized rewards, -8 chips of a 20 chip stack on average
+    nodes = {0: board, 1: children[0], 2: children[1]}
+    weight = 2 * EXPLORATION
+
+    # the second worker goes down the other child while the first one's virtual loss is on its path
+    first = _select(tree, nodes, weight)
+    _virtual_loss(tree, first, 1, NormalizedBackup(20).loss)
+    second = _select(tree, nodes, weight)
+    assert first != second
+
+    # a game drawing its children at random can not be numbered the same in every worker
+    monkeypatch.setattr(poker_mcts, 'EXACT_SHOWDOWN', False)
+    with pytest.raises(ValueError):
+        TreeParallelMCTS(workers=2, **parallel_args()).search(board, max_rollouts=10)
+
+
+def test_max_nodes_eviction():
+    # the least visited leaves are evicted to keep the tree under max_nodes, the search goes on
+    for searcher in (MCTS, ArrayMCTS):
+        random.seed(0)
+        tree = new_search_tree(searcher, max_nodes=300)
+        for _ in range(40):
+            tree.search(flop(), max_rollouts=50)
+            assert tree.footprint().nodes <= 300
+        assert tree.evictions > 0 and tree.evicted_nodes > 0
+
+
+def test_early_stop_on_a_dominant_move():
+    # folding 7 2 to a raise on A K Q is clearly best, the search stops long before max_rollouts
+    board = facing_raise('H7', 'S2')
+    random.seed(0)
+    tree = new_search_tree()
+    move = tree.search(board, max_rollouts=2000, confidence=0.95)
+    assert move.folded == 'ma'
+    assert tree.last_search.stop_reason == 'confident'
+    assert tree.last_search.rollouts < 500 and tree.last_search.rollouts_saved == 2000 - tree.last_search.rollouts
+
+    # without the early stop it runs to max_rollouts
+    random.seed(0)
+    tree = new_search_tree()
+    tree.search(board, max_rollouts=200)
+    assert tree.last_search.stop_reason == 'max_rollouts' and tree.last_search.rollouts == 200
+
+
+def test_instrumented_search_stats():
+    # off, the tree keeps the plain methods and has no stats
+    tree = new_search_tree()
+    tree.search(flop(), max_rollouts=50)
+    assert tree.stats is None and '_select' not in vars(tree)
+
+    for searcher in (MCTS, ArrayMCTS, ISMCTS):
+        random.seed(0)
+        tree = new_search_tree(searcher, instrument=True)
+        tree.search(flop(), max_rollouts=100)
+        stats = tree.stats
+        assert stats.rollouts == 100 and stats.nodes > 1 and stats.max_depth >= stats.mean_depth > 0
+        assert 0 < sum(stats.phase_seconds.values()) <= stats.elapsed
+        assert set(stats.cache_hit_rates) == {'showdown', 'all_in_equity'}
+
+
+def test_vectorized_and_scalar_uct_pick_the_same_child():
+    for searcher in (MCTS, ArrayMCTS):
+        random.seed(0)
+        tree = new_search_tree(searcher)
+        tree.search(flop(), max_rollouts=300)
+
+        picks = {}
+        for vectorize_from in (1, 10 ** 6):
+            tree.vectorize_from = vectorize_from
+            if searcher is MCTS:
+                nodes = [node for node, children in tree.children.items()
+                         if len(children) > 1 and node not in tree.untried and node not in tree.draws]
+                picks[vectorize_from] = [tree._uct_select(node) for node in nodes]
+            else:
+                nodes = [i for i in range(len(tree.nodes)) if tree.count[i] > 1 and i not in tree.draws
+                         and tree.N[tree._kids(i)].min() > 0]
+                picks[vectorize_from] = [int(tree._uct_select(i, tree._kids(i), tree.N[tree._kids(i)])) for i in nodes]
+            assert nodes
+        assert picks[1] == picks[10 ** 6]
+
+
+def test_progressive_widening_of_chance_nodes():
+    # the turn cards dealt below the chance node grow as sqrt of its visits, not all at once
+    board = quads_on_the_flop()
+    for searcher in (MCTS, ArrayMCTS):
+        random.seed(0)
+        tree = new_search_tree(searcher, widening=(1, 0.5))
+        tree.search(board, max_rollouts=400)
+        key = board if searcher is MCTS else tree.ids[board]
+        dealt = len(tree.children[key]) if searcher is MCTS else tree.count[key]
+        assert dealt <= len(tree.draws[key]) <= 400 ** 0.5 + 1
+
+    # without widening every deal is a child as soon as the node is expanded
+    tree = new_search_tree(widening=None)
+    tree.search(board, max_rollouts=100)
+    assert board not in tree.draws and len(tree.children[board]) == len(board.find_children()) > 400 ** 0.5 + 1
+
+
+def test_search_stops_on_deadline_and_cancel():
+    board = flop()
+    tree = new_search_tree()
+    # the clock and the event are checked after every rollout, at least one is done
+    tree.search(board, deadline=time.monotonic() - 1)
+    assert tree.last_search.rollouts == 1 and tree.last_search.stop_reason == 'deadline'
+    rollouts = 1
+
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    tree.search(board, cancel=cancel)
+    assert cancel.is_set() and tree.last_search.stop_reason == 'cancelled' and tree.last_search.rollouts > 1
+    rollouts += tree.last_search.rollouts
+
+    tree.search(board, deadline=time.monotonic() + 0.2, max_rollouts=10 ** 9)
+    assert tree.last_search.stop_reason == 'deadline' and 0.2 <= tree.last_search.elapsed < 1
+    rollouts += tree.last_search.rollouts
+
+    # the statistics of every rollout are kept, stopped searches included
+    assert tree.N[board] == rollouts
+
+    with pytest.raises(ValueError):
+        tree.search(board)
+
+
+def test_reroot_keeps_the_subtree_of_the_move_played():
+    board = flop()
+    for searcher in (MCTS, ArrayMCTS):
+        random.seed(0)
+        tree = new_search_tree(searcher)
+        tree.search(board, max_rollouts=300)
+        played = tree.choose(board)
+        kept = {child: (q, n) for child, q, n in tree.child_stats(played)}
+        assert tree.child_stats(board) and kept
+
+        report = tree.reroot(played)
+        assert report.nodes_after < report.nodes_before and report.bytes_after < report.bytes_before
+        assert report.nodes_after == tree.footprint().nodes
+        assert {child: (q, n) for child, q, n in tree.child_stats(played)} == kept
+        # the root and its other children are freed
+        assert tree.child_stats(board) == []
+
+        # the search goes on from the kept statistics
+        tree.search(played, max_rollouts=50)
+        assert sum(n for _, _, n in tree.child_stats(played)) > sum(n for _, n in kept.values())
+
+
+def test_leaf_simulations_in_a_batch():
+    # every rollout simulates its leaf leaf_simulations times and backs up all of them, the first
+    # one's leaf is the root
+    for searcher in (MCTS, ArrayMCTS):
+        random.seed(0)
+        tree = new_search_tree(searcher, leaf_simulations=4)
+        tree.search(flop(), max_rollouts=50)
+        assert sum(n for _, _, n in tree.child_stats(flop())) == 4 * 49
+
+    # the showdowns scored in one batch are scored as one at a time
+    random.seed(0)
+    tree = new_search_tree()
+    ends = [tree._playout(flop())[0] for _ in range(200)]
+    assert any(end.winner is None for end in ends)
+    assert flop().batch_rewards(ends) == pytest.approx([end.reward() for end in ends])
+
+
+def test_every_child_is_tried_once_before_uct():
+    board = flop()
+    children = board.find_children()
+    assert len(children) > 2
+    for searcher in (MCTS, ArrayMCTS):
+        random.seed(0)
+        tree = new_search_tree(searcher)
+        # the first rollout expands the root, each of the next ones tries a new child
+        tree.search(board, max_rollouts=1 + len(children))
+        assert sorted(n for _, _, n in tree.child_stats(board)) == [1] * len(children)
+        if searcher is MCTS:
+            # the root's list of untried children is dropped once it is empty
+            tree.search(board, max_rollouts=1)
+            assert board not in tree.untried
+
+
+def test_truncated_simulations_use_the_estimate():
+    # the estimate of a flop is the reward of the machine's all in equity as the winner
+    board = flop()
+    win, tie = all_in_equity(board.tup[0:2], board.tup[2:5])
+    machine = (board.money_machine - board.money_opp) / 2 + (win + tie / 2 - 0.5) * board.money_middle
+    assert board.estimate() == pytest.approx(machine)
+
+    # truncated at the leaf, the simulation is the estimate scored by the backup, for the player who moved in
+    tree = new_search_tree(truncate=0)
+    assert tree._simulate(board) == tree.backup.flip(tree.backup.score(board.estimate()), 1)
+
+    # truncated by a test on the node, the simulations stop on the turn or before
+    random.seed(0)
+    tree = new_search_tree(truncate=lambda node: node.street() > 3)
+    for _ in range(50):
+        end, _ = tree._playout(board)
+        assert end.is_terminal() or end.street() == 4
+
+    # a game without an estimate is simulated to the end
+    with pytest.raises(NotImplementedError):
+        new_tic_tac_toe_board().estimate()
+
+
+def test_tournament_seats_and_report():
+    # the machine raised 10 on the flop, the opponent to act
+    board = PokerBoard(hand('D9', 'C9', 'S14', 'D13', 'C12') + (None, None) + hand('H2', 'H3'), False, None, False, 5, 20, 15, False, False, True, False, 5, 15, None)
+
+    # the opponent's seat sees its own cards as the machine's, not the machine's, and has the opponent's moves
+    view = seat_view(board, False)
+    assert view.turn and view.tup[0:2] == board.tup[7:9] and view.tup[2:9] == board.tup[2:7] + (None, None)
+    assert {child.mirrored() for child in board.mirrored().find_children()} == set(board.find_children())
+    assert seat_view(board, True).tup == board.tup[0:7] + (None, None)
+
+    engines = (Engine('uniform', rollouts=20), Engine('hand strength', rollouts=20, rollout_policy=hand_strength_rollout))
+    won, latencies, sessions = play_match(engines, 6, seed=0)
+    assert len(won) == 6 and all(latencies)
+    # what one engine wins the other loses : the first engine's stack stays within the chips of both
+    # players, a new session starts when either stack is empty
+    stack = new_poker_board().money_machine
+    first, new_sessions = stack, 1
+    for chips in won:
+        if first in (0, 2 * stack):
+            first, new_sessions = stack, new_sessions + 1
+        first += chips
+        assert 0 <= first <= 2 * stack
+    assert sessions == new_sessions
+
+    report = tournament(engines, 4)
+    assert report.hands == 4 and report.ci_low <= report.chips_per_hand <= report.ci_high
+    assert set(report.latency) == {'uniform', 'hand strength'}
+    assert all(p50 <= p90 <= p99 for p50, p90, p99 in report.latency.values())
@@ -5,19 +5,124 @@ See also https://en.wikipedia.org/wiki/Monte_Carlo_tree_search
 https://gist.github.com/qpwo/c538c6f73727e254fdc7fab81024f6e1
 """
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+import heapq
 import math
 import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+# what a call to MCTS.search did : number of rollouts, seconds spent and why it stopped
+# ('max_rollouts', 'deadline', 'cancelled', or early 'confident' / 'stable'), an early stop
+# also tells the rollouts left of max_rollouts and the seconds left before the deadline
+SearchReport = namedtuple("SearchReport", "rollouts elapsed stop_reason rollouts_saved seconds_saved", defaults=(0, 0.0))
+
+# number of nodes stored in a tree and an estimate of the bytes they take
+Footprint = namedtuple("Footprint", "nodes bytes")
+
+# what MCTS.reroot freed
+RerootReport = namedtuple("RerootReport", "nodes_before nodes_after bytes_before bytes_after")
+
+# what the rollouts between two choices did, in tree.stats of an instrumented tree (MCTS(instrument=True)) :
+# seconds in the rollouts and in each phase ('select', 'expand', 'simulate', 'backpropagate'), depth of
+# the selected leaves, mean number of children of the expanded nodes, nodes in the tree and the hit rate
+# of every cache of the game (Node.cache_info) over the rollouts, None when it was not used
+SearchStats = namedtuple("SearchStats", "rollouts elapsed rollouts_per_sec phase_seconds max_depth mean_depth branching nodes cache_hit_rates")
+
+
+class WinRateBackup:
+    "Rewards in [0, 1] (1 win, 0 loss, .5 tie) : what is r for one player is 1 - r for the other"
+
+    exploration_scale = 1  # width of the reward range, the exploration weight is given for a width of 1
+    loss = 0  # reward of a lost simulation, what a virtual loss adds to Q in TreeParallelMCTS
+
+    def score(self, reward):
+        "Reward of a simulation as it is added up in Q"
+        return reward
+
+    def flip(self, total, visits):
+        "Total reward of `visits` simulations for the other player"
+        return visits - total
+
+
+class NegamaxBackup(WinRateBackup):
+    "Zero-sum rewards on any scale (e.g. chips) up to +-scale : what is r for one player is -r for the other"
+
+    def __init__(self, scale=1):
+        self.scale = scale
+        self.exploration_scale = 2 * scale
+        self.loss = -scale
+
+    def flip(self, total, visits):
+        return -total
+
+
+class NormalizedBackup(NegamaxBackup):
+    "Zero-sum rewards divided by `scale` (e.g. the starting stack), so that they fall in [-1, 1]"
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.exploration_scale = 2
+        self.loss = -1
+
+    def score(self, reward):
+        return reward / self.scale
+
 
 class MCTS:
     "Monte Carlo tree searcher. First rollout the tree then choose a move."
 
-    def __init__(self, exploration_weight=20):
+    # over budget, leaves are evicted until the tree is back to this share of max_nodes / max_bytes
+    evict_to = 0.75
+
+    # fan-out from which _uct_select scores the children with NumPy, below it plain Python is faster
+    vectorize_from = 32
+
+    # rollouts between two checks of the early stops of search
+    stop_check_every = 16
+
+    def __init__(self, exploration_weight=20, widening=(1, 0.5), max_nodes=None, max_bytes=None, leaf_simulations=1, rollout_policy=None, truncate=None, backup=None, instrument=False):
         self.Q = defaultdict(int)  # total reward of each node
         self.N = defaultdict(int)  # total visit count for each node
         self.children = dict()  # children of each node
+        self.untried = dict()  # children of each node not expanded yet, popped by _select
         self.exploration_weight = exploration_weight
+        # progressive widening of chance nodes : (c, alpha) lets a chance node visited N times
+        # have up to c * N ** alpha sampled children, None expands them all with find_children
+        self.widening = widening
+        self.draws = dict()  # outcomes sampled at each chance node, repeated as often as drawn
+        # simulations run from each expanded leaf, scored together with Node.batch_rewards
+        self.leaf_simulations = leaf_simulations
+        # function of a node giving the next node of a simulation, find_random_child when None
+        self.rollout_policy = rollout_policy
+        # truncated simulations : an int stops them after that many moves, a function of a node stops
+        # them at the first node it is true for, the reward is then Node.estimate() of that node
+        self.truncate = truncate
+        # how rewards are scored and flipped between the players, WinRateBackup when None ;
+        # the exploration weight is multiplied by its exploration_scale
+        self.backup = backup or WinRateBackup()
         self.tmp = 0
+        self.last_search = None  # SearchReport of the last search
+        self._init_budget(max_nodes, max_bytes)
+        # instrumented, the phases of the rollouts are timed and every choose leaves a SearchStats
+        # here ; otherwise nothing is wrapped and the rollouts cost the same as before
+        self.stats = None
+        if instrument:
+            _Instruments(self)
+
+    def _init_budget(self, max_nodes, max_bytes):
+        # memory cap : the least visited leaves are evicted once the footprint is over max_nodes
+        # nodes or max_bytes bytes, the footprint is only measured when _size() reaches _next_check
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self._next_check = 0 if max_nodes or max_bytes else math.inf
+        self._root = None  # node of the last rollout, never evicted
+        self.evictions = 0  # number of times the tree went over budget
+        self.evicted_nodes = 0  # number of leaves evicted
+        self.last_footprint = None  # Footprint measured at the last budget check
 
     def choose(self, node):
         "Choose the best successor of node. (Choose a move in the game)"
@@ -49,6 +154,116 @@ class MCTS:
         return max(self.children[node], key=score)
 
 
+    def search(self, node, deadline=None, max_rollouts=None, cancel=None, confidence=None, stable=None):
+        """Rollout from node until `deadline` (a time.monotonic() value) has passed, `max_rollouts`
+        rollouts are done or the `cancel` event (e.g. a threading.Event) is set, then choose.
+        The clock is checked between rollouts, so at least one rollout is done and the statistics
+        of all of them are kept in the tree ; self.last_search tells how many there were.
+
+        Early stops, checked every stop_check_every rollouts : with `confidence` (e.g. 0.95) once the
+        confidence interval of the best child of node is above the intervals of all the others, with
+        `stable` once the best child has not changed for that many rollouts."""
+        if deadline is None and max_rollouts is None and cancel is None:
+            raise ValueError("search needs a deadline, max_rollouts or a cancel event to stop")
+
+        start = time.monotonic()
+        rollouts = 0
+        best, since = None, 0  # best child at the last check and the rollouts done when it became best
+        count = total = squares = 0  # rewards of the simulations, for their variance
+        while True:
+            reward, visits = self.do_rollout(node)
+            rollouts += 1
+            count += visits
+            total += reward
+            squares += reward * reward / visits
+            if max_rollouts is not None and rollouts >= max_rollouts:
+                stop_reason = "max_rollouts"
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                stop_reason = "deadline"
+                break
+            if cancel is not None and cancel.is_set():
+                stop_reason = "cancelled"
+                break
+            if (confidence is not None or stable is not None) and rollouts % self.stop_check_every == 0:
+                stats = self.child_stats(node)
+                leader = max(stats, key=lambda s: s[1] / s[2] if s[2] else -math.inf)[0] if stats else None
+                if leader != best:
+                    best, since = leader, rollouts
+                if confidence is not None and self._separated(stats, confidence, squares / count - (total / count) ** 2):
+                    stop_reason = "confident"
+                    break
+                if stable is not None and rollouts - since >= stable:
+                    stop_reason = "stable"
+                    break
+
+        if self.max_nodes or self.max_bytes:
+            # the footprint is only measured now and then during the rollouts, the tree can go a little
+            # over the cap between two checks but is back under it when the search returns
+            self._check_budget()
+        elapsed = time.monotonic() - start
+        if stop_reason in ("confident", "stable"):
+            self.last_search = SearchReport(rollouts, elapsed, stop_reason,
+                                            0 if max_rollouts is None else max_rollouts - rollouts,
+                                            0.0 if deadline is None else max(deadline - time.monotonic(), 0.0))
+        else:
+            self.last_search = SearchReport(rollouts, elapsed, stop_reason)
+        return self.choose(node)
+
+    def child_stats(self, node):
+        "(child, total reward, visit count) of every child of node in the tree"
+        return [(child, self.Q[child], self.N[child]) for child in self.children.get(node, ())]
+
+    @staticmethod
+    def _separated(stats, confidence, variance):
+        """True when the best average of stats is above the others with probability `confidence`, the
+        averages taken as normal with the variance of all the simulations (a bound for a fold as well)"""
+        if len(stats) < 2:
+            return len(stats) == 1
+        if any(n == 0 for _, _, n in stats):
+            return False
+        # the error is shared out between the comparisons with the best child
+        z = statistics.NormalDist().inv_cdf(1 - (1 - confidence) / (2 * (len(stats) - 1)))
+        spread = z * math.sqrt(max(variance, 0.0))
+        bounds = sorted(((q / n, spread / math.sqrt(n)) for _, q, n in stats), reverse=True)
+        (mean, error), others = bounds[0], bounds[1:]
+        return all(mean - error > other + other_error for other, other_error in others)
+
+    def reroot(self, node):
+        """Keep the statistics of node and its descendants (e.g. the state reached by the real moves
+        played) and free the rest of the tree"""
+        before = self.footprint()
+
+        keep = {node}
+        stack = [node]
+        while stack:
+            for child in self.children.get(stack.pop(), ()):
+                if child not in keep:
+                    keep.add(child)
+                    stack.append(child)
+
+        # new dicts, as dicts do not shrink when items are deleted
+        self.Q = defaultdict(int, {n: q for n, q in self.Q.items() if n in keep})
+        self.N = defaultdict(int, {n: visits for n, visits in self.N.items() if n in keep})
+        self.children = {n: c for n, c in self.children.items() if n in keep}
+        self.untried = {n: u for n, u in self.untried.items() if n in keep}
+        self.draws = {n: d for n, d in self.draws.items() if n in keep}
+
+        after = self.footprint()
+        return RerootReport(before.nodes, after.nodes, before.bytes, after.bytes)
+
+    def footprint(self):
+        "Number of nodes in the tree and an estimate of the bytes used to store them"
+        nodes = self.N.keys() | self.children.keys()
+        for children in self.children.values():
+            nodes.update(children)
+        size = sum(map(sys.getsizeof, (self.Q, self.N, self.children, self.untried, self.draws)))
+        size += sum(map(sys.getsizeof, self.Q.values())) + sum(map(sys.getsizeof, self.N.values()))
+        size += sum(map(sys.getsizeof, self.children.values())) + sum(map(sys.getsizeof, self.draws.values()))
+        size += sum(map(sys.getsizeof, self.untried.values()))
+        size += sum(map(sys.getsizeof, nodes))
+        return Footprint(len(nodes), size)
+
     def choose_estimate_with_level(self, node,level):
         "Choose the best successor of node. (Choose a move in the game)"
         if node.is_terminal():
@@ -115,7 +330,7 @@ class MCTS:
 
         
     def do_rollout(self, node):
-        "Make the tree one layer better. (Train for one iteration.)"
+        "Make the tree one layer better. (Train for one iteration.) Returns the reward of the simulations and their number"
         self.tmp += 1
         # print('do rollout count : ', self.tmp)
 
@@ -124,10 +339,78 @@ class MCTS:
         leaf = path[-1]
         # print('do_rollout LEAF : ', leaf)
         self._expand(leaf)
-        reward = self._simulate(leaf)
-        #print('reward : ', reward)
-        self._backpropagate(path, reward)
+        visits = max(self.leaf_simulations, 1)
+        if visits > 1:
+            reward = self._simulate_batch(leaf, visits)
+        else:
+            reward = self._simulate(leaf)
+            #print('reward : ', reward)
+        self._backpropagate(path, reward, visits)
         #print('_backpropagate done')
+        self._root = node
+        if self._size() >= self._next_check:
+            self._check_budget()
+        return reward, visits
+
+    def _size(self):
+        "Cheap measure of the tree size, growing with the footprint"
+        return len(self.children)
+
+    def _fan_outs(self):
+        "Number of children of every expanded node with children"
+        return [len(children) for children in self.children.values() if children]
+
+    def _check_budget(self):
+        "Evict the least visited leaves if the tree is over max_nodes or max_bytes"
+        footprint = self.footprint()
+        if self._over_budget(footprint, 1):
+            self.evictions += 1
+            while self._over_budget(footprint, self.evict_to):
+                # a share of the expanded nodes in proportion to the excess, the parents of the
+                # evicted leaves can become leaves for the next round
+                ratio = min(self.max_nodes * self.evict_to / footprint.nodes if self.max_nodes else 1,
+                            self.max_bytes * self.evict_to / footprint.bytes if self.max_bytes else 1)
+                evicted = self._evict(math.ceil(self._size() * (1 - ratio)))
+                if not evicted:
+                    break
+                self.evicted_nodes += evicted
+                footprint = self.footprint()
+        self.last_footprint = footprint
+
+        # next check when the tree has grown to what the budget allows at the current footprint per node
+        size = max(self._size(), 1)
+        allowed = min(self.max_nodes * size / max(footprint.nodes, 1) if self.max_nodes else math.inf,
+                      self.max_bytes * size / footprint.bytes if self.max_bytes else math.inf)
+        self._next_check = max(int(allowed), self._size() + 1)
+
+    def _over_budget(self, footprint, share):
+        return ((self.max_nodes is not None and footprint.nodes > share * self.max_nodes)
+                or (self.max_bytes is not None and footprint.bytes > share * self.max_bytes))
+
+    def _evict(self, count):
+        """Forget the children and statistics of up to `count` of the least visited leaves (expanded
+        nodes without expanded children), which become unexplored nodes again"""
+        expanded = self.children.keys()
+        leaves = [n for n, c in self.children.items() if n != self._root and expanded.isdisjoint(c)]
+        leaves = heapq.nsmallest(count, leaves, key=self.N.__getitem__)
+        for n in leaves:
+            del self.children[n]
+            self.untried.pop(n, None)
+            self.draws.pop(n, None)
+
+        # the evicted leaves are untried children of their parents again
+        evicted = set(leaves)
+        for n, children in self.children.items():
+            if n not in self.draws and not evicted.isdisjoint(children):
+                self.untried.setdefault(n, []).extend(evicted & children)
+
+        # new dicts, as dicts do not shrink when items are deleted
+        self.Q = defaultdict(int, {n: q for n, q in self.Q.items() if n in expanded})
+        self.N = defaultdict(int, {n: visits for n, visits in self.N.items() if n in expanded})
+        self.children = dict(self.children)
+        self.untried = dict(self.untried)
+        self.draws = dict(self.draws)
+        return len(leaves)
 
     def _select(self, node):
         "Find an unexplored descendent of `node`"
@@ -136,67 +419,576 @@ class MCTS:
         while True:
             # print('node : ', node)
             path.append(node)
+            if node in self.draws:
+                node = self._sample_chance(node)
+                if node not in self.children:
+                    path.append(node)
+                    return path
+                continue
             if node not in self.children or not self.children[node]:
                 # print('########## node is either unexplored or terminal ###########')
                 # node is either unexplored or terminal
                 return path
-            unexplored = self.children[node] - self.children.keys()
-            # print('unexplored : ', len(unexplored))
-            if unexplored:
-                n = unexplored.pop()
-                path.append(n)
-                return path
+            untried = self.untried.get(node)
+            while untried:
+                n = untried.pop()
+                if n not in self.children:  # may have been expanded from another parent
+                    path.append(n)
+                    return path
+            if untried is not None:
+                del self.untried[node]
             node = self._uct_select(node)  # descend a layer deeper
 
     def _expand(self, node):
         "Update the `children` dict with the children of `node`"
         if node in self.children:
             return  # already expanded
+        if self.widening is not None and node.is_chance():
+            # outcomes are sampled when the node is selected, see _sample_chance
+            self.children[node] = set()
+            self.draws[node] = []
+            return
         self.children[node] = node.find_children()
+        self.untried[node] = list(self.children[node])
+
+    def _sample_chance(self, node):
+        "Sample an outcome of a chance node, drawing a new one while the visit count allows"
+        c, alpha = self.widening
+        draws = self.draws[node]
+        if len(draws) < c * (self.N[node] + 1) ** alpha:
+            child = node.find_random_child()
+            draws.append(child)
+            self.children[node].add(child)
+            return child
+        return random.choice(draws)
 
     def _simulate(self, node):
-        "Returns the reward for a random simulation (to completion) of `node`"
+        "Returns the reward for a simulation (to completion) of `node` played by the rollout policy"
+        node, invert_reward = self._playout(node)
+        reward = self.backup.score(node.reward() if node.is_terminal() else node.estimate())
+        # print('SIMULATION reward : ', reward)
+        return self.backup.flip(reward, 1) if invert_reward else reward
+
+    def _simulate_batch(self, node, simulations):
+        "Returns the total reward of random simulations of `node`, their terminal nodes scored together"
+        playouts = [self._playout(node) for _ in range(simulations)]
+        rewards = iter(node.batch_rewards([end for end, _ in playouts if end.is_terminal()]))
+        total = 0
+        for end, invert_reward in playouts:
+            reward = self.backup.score(next(rewards) if end.is_terminal() else end.estimate())
+            total += self.backup.flip(reward, 1) if invert_reward else reward
+        return total
+
+    def _playout(self, node):
+        """Returns the terminal (or truncated) node of a simulation of `node` and whether its reward is the enemy's,
+        the reward changes sides at every move but not at the outcomes of chance nodes"""
         invert_reward = True
+        depth = 0
         while True:
             #print('SIMULATION node before :', node)
             #print('SIMULATION node.is_terminal() ; ', node.is_terminal())
             if node.is_terminal():
-                reward = node.reward()
-                # print('SIMULATION reward : ', reward)
-                return 1 - reward if invert_reward else reward
+                return node, invert_reward
+            if self.truncate is not None and (depth >= self.truncate if isinstance(self.truncate, int) else self.truncate(node)):
+                return node, invert_reward
+            depth += 1
 
+            chance = node.is_chance()
             try:
-                node = node.find_random_child()
+                node = node.find_random_child() if self.rollout_policy is None else self.rollout_policy(node)
                 pass
             except Exception as e:
                 print('EERRRROR')
                 print(node) 
             
             #print('SIMULATION node after :', node)
-            invert_reward = not invert_reward
+            if not chance:
+                invert_reward = not invert_reward
 
-    def _backpropagate(self, path, reward):
-        "Send the reward back up to the ancestors of the leaf"
-        for node in reversed(path):
-            self.N[node] += 1
+    def _backpropagate(self, path, reward, visits=1):
+        "Send the reward (of `visits` simulations) back up to the ancestors of the leaf"
+        for node, reward in zip(path, self._path_rewards(path, reward, visits)):
+            self.N[node] += visits
             self.Q[node] += reward
-            reward = 1 - reward  # 1 for me is 0 for my enemy, and vice versa
+
+    def _path_rewards(self, path, reward, visits):
+        "Reward of every node of path from the leaf's, flipped for the other player above every move but not above chance nodes"
+        rewards = [reward] * len(path)
+        for k in range(len(path) - 1, 0, -1):
+            if not path[k - 1].is_chance():
+                reward = self.backup.flip(reward, visits)  # 1 for me is 0 for my enemy, and vice versa
+            rewards[k - 1] = reward
+        return rewards
 
     def _uct_select(self, node):
         "Select a child of node, balancing exploration & exploitation"
 
-        # All children of node should already be expanded:
-        assert all(n in self.children for n in self.children[node])
+        # All children of node are expanded, _select only comes here once node.untried is empty
+        children = self.children[node]
+        explore = self.exploration_weight * self.backup.exploration_scale * _sqrt_log(self.N[node])
+
+        if len(children) < self.vectorize_from:
+            def uct(n):
+                "Upper confidence bound for trees"
+                return self.Q[n] / self.N[n] + explore / math.sqrt(self.N[n])
+
+            return max(children, key=uct)
+
+        children = list(children)
+        q = np.fromiter([self.Q[n] for n in children], dtype=float, count=len(children))
+        n = np.fromiter([self.N[n] for n in children], dtype=float, count=len(children))
+        return children[(q / n + explore / np.sqrt(n)).argmax()]
+
+
+class ArrayMCTS(MCTS):
+    """
+    Same search as MCTS with the tree stored in arrays : every node gets an integer id,
+    its statistics live in growable NumPy arrays and its children are a contiguous range
+    of ids in `edges`, so selection works on ids without hashing the nodes again.
+    """
+
+    # fan-out from which _uct_select scores the children with NumPy, lower than in MCTS as the
+    # children's statistics are already arrays here
+    vectorize_from = 16
+
+    def __init__(self, exploration_weight=20, widening=(1, 0.5), capacity=1024, max_nodes=None, max_bytes=None, leaf_simulations=1, rollout_policy=None, truncate=None, backup=None, instrument=False):
+        self.exploration_weight = exploration_weight
+        self.widening = widening
+        self.leaf_simulations = leaf_simulations
+        self.rollout_policy = rollout_policy
+        self.truncate = truncate
+        self.backup = backup or WinRateBackup()
+        self.tmp = 0
+        self.ids = dict()  # id of each node, only looked up for the root and new children
+        self.nodes = []  # node of each id
+        self.Q = np.zeros(capacity)  # total reward of each node
+        self.N = np.zeros(capacity, dtype=np.int64)  # total visit count for each node
+        self.first = np.full(capacity, -1, dtype=np.int64)  # start of the children in edges, -1 if not expanded
+        self.count = np.zeros(capacity, dtype=np.int64)  # number of children
+        self.room = np.zeros(capacity, dtype=np.int64)  # slots reserved in edges for the children
+        self.edges = np.zeros(capacity, dtype=np.int64)  # children ids, one range per expanded node
+        self.n_edges = 0
+        self.draws = dict()  # ids sampled at each chance node, repeated as often as drawn
+        self.last_search = None  # SearchReport of the last search
+        self._init_budget(max_nodes, max_bytes)
+        self.stats = None
+        if instrument:
+            _Instruments(self)
+
+    def _id(self, node):
+        "Id of node, adding it to the tree if it is new"
+        i = self.ids.get(node)
+        if i is None:
+            i = len(self.nodes)
+            if i == len(self.N):
+                size = 2 * i
+                self.Q = _grown(self.Q, size, 0)
+                self.N = _grown(self.N, size, 0)
+                self.first = _grown(self.first, size, -1)
+                self.count = _grown(self.count, size, 0)
+                self.room = _grown(self.room, size, 0)
+            self.ids[node] = i
+            self.nodes.append(node)
+        return i
+
+    def _reserve(self, i, room):
+        "Reserve a range of `room` children for node i at the end of edges"
+        end = self.n_edges + room
+        if end > len(self.edges):
+            self.edges = _grown(self.edges, max(end, 2 * len(self.edges)), 0)
+        self.first[i] = self.n_edges
+        self.room[i] = room
+        self.n_edges = end
+
+    def _kids(self, i):
+        start = self.first[i]
+        return self.edges[start:start + self.count[i]]
+
+    def choose(self, node):
+        "Choose the best successor of node. (Choose a move in the game)"
+        if node.is_terminal():
+            raise RuntimeError(f"choose called on terminal node {node}")
+
+        i = self.ids.get(node)
+        if i is None or self.first[i] == -1:
+            return node.find_random_child()
+
+        kids = self._kids(i)
+        return self.nodes[kids[self._scores(kids).argmax()]]
+
+    def child_stats(self, node):
+        i = self.ids.get(node)
+        if i is None or self.first[i] == -1:
+            return []
+        kids = self._kids(i)
+        return [(self.nodes[k], float(self.Q[k]), int(self.N[k])) for k in kids.tolist()]
+
+    def choose_estimate_with_level(self, node, level):
+        "Choose the best (level 3), one of the 2 best (level 2) or the 2nd / 3rd best (level 1) successor"
+        if node.is_terminal():
+            raise RuntimeError(f"choose called on terminal node {node}")
+
+        i = self.ids.get(node)
+        if i is None or self.first[i] == -1:
+            return node.find_random_child()
+
+        kids = self._kids(i)
+        return _choose_with_level([self.nodes[k] for k in kids[np.argsort(-self._scores(kids), kind="stable")]], level)
+
+    def reroot(self, node):
+        """Keep the statistics of node and its descendants (e.g. the state reached by the real moves
+        played) and free the rest of the tree, renumbering the kept nodes from 0"""
+        before = self.footprint()
 
-        log_N_vertex = math.log(self.N[node])
+        keep = []
+        root = self.ids.get(node)
+        if root is not None:
+            keep.append(root)
+            seen = {root}
+            for i in keep:  # grows while it is walked, breadth first
+                if self.first[i] != -1:
+                    for child in self._kids(i).tolist():
+                        if child not in seen:
+                            seen.add(child)
+                            keep.append(child)
 
-        def uct(n):
-            "Upper confidence bound for trees"
-            return self.Q[n] / self.N[n] + self.exploration_weight * math.sqrt(
-                log_N_vertex / self.N[n]
-            )
+        old = np.array(keep, dtype=np.int64)
+        new_id = np.full(len(self.nodes), -1, dtype=np.int64)
+        new_id[old] = np.arange(len(old))
+        capacity = max(1024, 2 * len(old))
 
-        return max(self.children[node], key=uct)
+        expanded = self.first[old] != -1
+        room = np.where(expanded, self.room[old], 0)
+        first = np.where(expanded, np.cumsum(room) - room, -1)
+        edges = np.zeros(max(1024, 2 * int(room.sum())), dtype=np.int64)
+        for j in np.flatnonzero(expanded).tolist():
+            edges[first[j]:first[j] + self.count[keep[j]]] = new_id[self._kids(keep[j])]
+
+        self.nodes = [self.nodes[i] for i in keep]
+        self.ids = {n: i for i, n in enumerate(self.nodes)}
+        self.Q = _grown(self.Q[old], capacity, 0)
+        self.N = _grown(self.N[old], capacity, 0)
+        self.first = _grown(first, capacity, -1)
+        self.count = _grown(self.count[old], capacity, 0)
+        self.room = _grown(room, capacity, 0)
+        self.edges = edges
+        self.n_edges = int(room.sum())
+        self.draws = {int(new_id[i]): new_id[d].tolist() for i, d in self.draws.items() if new_id[i] != -1}
+
+        after = self.footprint()
+        return RerootReport(before.nodes, after.nodes, before.bytes, after.bytes)
+
+    def footprint(self):
+        "Number of nodes in the tree and an estimate of the bytes used to store them"
+        size = sum(a.nbytes for a in (self.Q, self.N, self.first, self.count, self.room, self.edges))
+        size += sys.getsizeof(self.ids) + sys.getsizeof(self.nodes) + sum(map(sys.getsizeof, self.nodes))
+        size += sys.getsizeof(self.draws) + sum(map(sys.getsizeof, self.draws.values()))
+        return Footprint(len(self.nodes), size)
+
+    def _scores(self, kids):
+        "Average reward of each child, -inf for unseen ones"
+        n = self.N[kids]
+        return np.where(n > 0, self.Q[kids] / np.maximum(n, 1), -np.inf)
+
+    def do_rollout(self, node):
+        "Make the tree one layer better. (Train for one iteration.) Returns the reward of the simulations and their number"
+        self.tmp += 1
+        path = self._select(self._id(node))
+        leaf = path[-1]
+        self._expand(leaf)
+        visits = max(self.leaf_simulations, 1)
+        if visits > 1:
+            reward = self._simulate_batch(self.nodes[leaf], visits)
+        else:
+            reward = self._simulate(self.nodes[leaf])
+        self._backpropagate(path, reward, visits)
+        self._root = node
+        if len(self.nodes) >= self._next_check:
+            self._check_budget()
+        return reward, visits
+
+    def _size(self):
+        return len(self.nodes)
+
+    def _fan_outs(self):
+        n = len(self.nodes)
+        counts = self.count[:n][self.first[:n] != -1]
+        return counts[counts > 0].tolist()
+
+    def _evict(self, count):
+        """Reset up to `count` of the least visited leaves (expanded nodes without expanded children)
+        to unexplored nodes, then compact the tree"""
+        n = len(self.nodes)
+        expanded = self.first[:n] != -1
+        root = self.ids[self._root]
+        leaves = [i for i in np.flatnonzero(expanded).tolist() if i != root and not expanded[self._kids(i)].any()]
+        leaves = heapq.nsmallest(count, leaves, key=self.N.__getitem__)
+        for i in leaves:
+            self.first[i] = -1
+            self.count[i] = self.room[i] = 0
+            self.Q[i] = self.N[i] = 0  # an unseen child again for its parents
+            self.draws.pop(i, None)
+        self.reroot(self._root)
+        return len(leaves)
+
+    def _select(self, i):
+        "Find an unexplored descendent of node i, as a path of ids"
+        path = []
+        while True:
+            path.append(i)
+            if self.first[i] == -1:
+                # node is unexplored
+                return path
+            if i in self.draws:
+                i = self._sample_chance(i)
+                if self.first[i] == -1:
+                    path.append(i)
+                    return path
+                continue
+            if self.count[i] == 0:
+                # node is terminal
+                return path
+            kids = self._kids(i)
+            n = self.N[kids]
+            j = n.argmin()
+            if n[j] == 0:
+                # children are only visited after being expanded
+                path.append(kids[j])
+                return path
+            i = self._uct_select(i, kids, n)  # descend a layer deeper
+
+    def _expand(self, i):
+        "Store the children of node i as a range of edges"
+        if self.first[i] != -1:
+            return  # already expanded
+        node = self.nodes[i]
+        if self.widening is not None and node.is_chance():
+            self._reserve(i, 4)
+            self.draws[i] = []
+            return
+        kids = [self._id(child) for child in node.find_children()]
+        self._reserve(i, len(kids))
+        self.edges[self.first[i]:self.first[i] + len(kids)] = kids
+        self.count[i] = len(kids)
+
+    def _sample_chance(self, i):
+        "Sample an outcome of chance node i, drawing a new one while the visit count allows"
+        c, alpha = self.widening
+        draws = self.draws[i]
+        if len(draws) < c * (self.N[i] + 1) ** alpha:
+            child = self._id(self.nodes[i].find_random_child())
+            draws.append(child)
+            if child not in self._kids(i):
+                if self.count[i] == self.room[i]:
+                    # no room left, move the children to a range twice as large
+                    kids = self._kids(i).copy()
+                    self._reserve(i, 2 * len(kids))
+                    self.edges[self.first[i]:self.first[i] + len(kids)] = kids
+                self.edges[self.first[i] + self.count[i]] = child
+                self.count[i] += 1
+            return child
+        return random.choice(draws)
+
+    def _backpropagate(self, path, reward, visits=1):
+        "Send the reward (of `visits` simulations) back up to the ancestors of the leaf"
+        rewards = self._path_rewards([self.nodes[i] for i in path], reward, visits)
+        self.N[path] += visits
+        self.Q[path] += rewards
+
+    def _uct_select(self, i, kids, n):
+        "Select a child of node i, balancing exploration & exploitation"
+        explore = self.exploration_weight * self.backup.exploration_scale * _sqrt_log(self.N[i])
+
+        if len(kids) < self.vectorize_from:
+            def uct(child):
+                "Upper confidence bound for trees"
+                _, q, visits = child
+                return q / visits + explore / math.sqrt(visits)
+
+            return max(zip(kids.tolist(), self.Q[kids].tolist(), n.tolist()), key=uct)[0]
+
+        uct = self.Q[kids] / n + explore / np.sqrt(n)
+        return kids[uct.argmax()]
+
+
+class ISMCTS(MCTS):
+    """
+    Information set MCTS : the statistics are kept per information set (Node.information_set,
+    what the searching player can observe) and every rollout plays a fresh determinization
+    (Node.determinize, the hidden parts dealt at random), so the sampled hidden cards share one tree.
+    Chance nodes are sampled on every visit ; widening, memory caps and leaf batches are not used.
+    """
+
+    def choose(self, node):
+        "Choose the best successor of node, as a child of one determinization of it"
+        if node.is_terminal():
+            raise RuntimeError(f"choose called on terminal node {node}")
+
+        children = self._children_by_set(node.determinize())
+        if node.information_set() not in self.children or not children:
+            return node.determinize().find_random_child()
+        return children[max(children, key=self._score)]
+
+    def choose_estimate_with_level(self, node, level):
+        "Choose the best (level 3), one of the 2 best (level 2) or the 2nd / 3rd best (level 1) successor"
+        if node.is_terminal():
+            raise RuntimeError(f"choose called on terminal node {node}")
+
+        children = self._children_by_set(node.determinize())
+        if node.information_set() not in self.children or not children:
+            return node.determinize().find_random_child()
+        return _choose_with_level([children[key] for key in sorted(children, key=self._score, reverse=True)], level)
+
+    def child_stats(self, node):
+        "(information set, total reward, visit count) of every child of node's information set in the tree"
+        return [(key, self.Q[key], self.N[key]) for key in self.children.get(node.information_set(), ())]
+
+    def _score(self, key):
+        if self.N[key] == 0:
+            return float("-inf")  # avoid unseen moves
+        return self.Q[key] / self.N[key]  # average reward
+
+    @staticmethod
+    def _children_by_set(state):
+        return {child.information_set(): child for child in state.find_children()}
+
+    def do_rollout(self, node):
+        "Make the tree one layer better, on a new determinization of node. Returns the reward of the simulation and 1"
+        self.tmp += 1
+        path, state = self._select(node.determinize())
+        leaf = path[-1]
+        if leaf not in self.children:
+            self.children[leaf] = set()  # its children are added as they are seen
+        reward = self._simulate(state)
+        self._backpropagate(path, reward)
+        return reward, 1
+
+    def _select(self, state):
+        "Find an unexplored information set below state, returns the path of information sets and the state reached"
+        path = []
+        while True:
+            key = state.information_set()
+            path.append(key)
+            if key not in self.children or state.is_terminal():
+                # node is either unexplored or terminal
+                return path, state
+            if state.is_chance():
+                state = state.find_random_child()
+                self.children[key].add(state.information_set())
+                continue
+
+            # the moves of this determinization
+            children = self._children_by_set(state)
+            self.children[key].update(children)
+            unexplored = [child for child in children if child not in self.children]
+            if unexplored:
+                child = random.choice(unexplored)
+                path.append(child)
+                return path, children[child]
+
+            explore = self.exploration_weight * self.backup.exploration_scale * _sqrt_log(self.N[key])
+            state = children[max(children, key=lambda n: self.Q[n] / self.N[n] + explore / math.sqrt(self.N[n]))]
+
+
+class _Instruments:
+    """
+    Timers wrapped around the phases of one tree's rollouts, as instance attributes so that the
+    other trees keep the plain methods. Every choose of the tree leaves a SearchStats in tree.stats
+    about the rollouts since the previous one.
+    """
+
+    PHASES = {"_select": "select", "_expand": "expand", "_simulate": "simulate",
+              "_simulate_batch": "simulate", "_backpropagate": "backpropagate"}
+
+    def __init__(self, tree):
+        self.tree = tree
+        for method, phase in self.PHASES.items():
+            setattr(tree, method, self._timed(getattr(tree, method), phase))
+        tree.do_rollout = self._rollout(tree.do_rollout)
+        for method in ("choose", "choose_estimate_with_level"):
+            setattr(tree, method, self._publishing(getattr(tree, method)))
+        self._reset()
+
+    def _reset(self):
+        self.rollouts = 0
+        self.elapsed = 0.0
+        self.phases = dict.fromkeys(self.PHASES.values(), 0.0)
+        self.depths = []
+        self.root = None
+        self.caches = None  # Node.cache_info() of the root before the first rollout
+
+    def _timed(self, method, phase):
+        def timed(*args):
+            start = time.perf_counter()
+            result = method(*args)
+            self.phases[phase] += time.perf_counter() - start
+            if phase == "select":
+                path = result[0] if isinstance(result, tuple) else result  # ISMCTS returns (path, state)
+                self.depths.append(len(path) - 1)
+            return result
+        return timed
+
+    def _rollout(self, do_rollout):
+        def rollout(node):
+            if self.root is None:
+                self.root = node
+                self.caches = node.cache_info()
+            start = time.perf_counter()
+            result = do_rollout(node)
+            self.elapsed += time.perf_counter() - start
+            self.rollouts += 1
+            return result
+        return rollout
+
+    def _publishing(self, choose):
+        def publishing(*args):
+            move = choose(*args)
+            self.tree.stats = self.snapshot()
+            self._reset()
+            return move
+        return publishing
+
+    def snapshot(self):
+        "SearchStats of the rollouts so far"
+        fan_outs = self.tree._fan_outs()
+        rates = {}
+        if self.root is not None:
+            for name, (hits, misses) in self.root.cache_info().items():
+                hits -= self.caches[name][0]
+                misses -= self.caches[name][1]
+                rates[name] = hits / (hits + misses) if hits + misses else None
+        return SearchStats(self.rollouts, self.elapsed, self.rollouts / self.elapsed if self.elapsed else 0.0,
+                           dict(self.phases), max(self.depths, default=0),
+                           sum(self.depths) / len(self.depths) if self.depths else 0.0,
+                           sum(fan_outs) / len(fan_outs) if fan_outs else 0.0,
+                           self.tree.footprint().nodes, rates)
+
+
+def _choose_with_level(ranked, level):
+    "From the successors ranked best first : the best (level 3), one of the 2 best (level 2) or the 2nd / 3rd best (level 1)"
+    if level == 3:
+        return ranked[0]
+    elif level == 2:
+        return random.choice(ranked[:2])
+    elif level == 1:
+        return random.choice(ranked[1:3] or ranked[:1])
+
+
+_SQRT_LOG = [0.0]  # sqrt(log(n)) of every visit count up to the largest seen
+
+
+def _sqrt_log(n):
+    "sqrt(log(n)) for the UCT exploration term, looked up in a table grown with the visit counts"
+    if n >= len(_SQRT_LOG):
+        _SQRT_LOG.extend(math.sqrt(math.log(k)) for k in range(len(_SQRT_LOG), max(2 * int(n), 1024)))
+    return _SQRT_LOG[n]
+
+
+def _grown(array, size, fill):
+    "Copy of array extended to size with fill"
+    grown = np.full(size, fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
 
 
 class Node(ABC):
@@ -221,11 +1013,39 @@ class Node(ABC):
         "Returns True if the node has no children"
         return True
 
+    def is_chance(self):
+        "Returns True if the successor is dealt at random (e.g. a card) rather than chosen"
+        return False
+
+    def has_random_children(self):
+        "Returns True if find_children can give other nodes on every call, which TreeParallelMCTS can not number"
+        return False
+
+    def information_set(self):
+        "What the searching player can observe of this state, the key of ISMCTS nodes"
+        return self
+
+    def determinize(self):
+        "A full state consistent with the information set, the hidden parts sampled at random"
+        return self
+
     @abstractmethod
     def reward(self):
         "Assumes `self` is terminal node. 1=win, 0=loss, .5=tie, etc"
         return 0
 
+    def estimate(self):
+        "Estimated reward of a nonterminal node, same scale as reward(), for truncated simulations"
+        raise NotImplementedError(f"{type(self).__name__} can not estimate a nonterminal node, simulate it to the end")
+
+    def batch_rewards(self, nodes):
+        "Rewards of terminal nodes of the same game, games that can score many at once override it"
+        return [node.reward() for node in nodes]
+
+    def cache_info(self):
+        "{name: (hits, misses)} of the caches the game looks up while it is searched, for SearchStats"
+        return {}
+
     @abstractmethod
     def __hash__(self):
         "Nodes must be hashable"
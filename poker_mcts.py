@@ -39,10 +39,17 @@ PokerBoard(tup=('H2', 'S2', M1, M2, M3, O1, O2), turn=False, winner=None, termin
 
 from collections import namedtuple
 from random import choice
-from cards import CardScores
-from monte_carlo_tree_search import MCTS, Node
+from cards import SHOWDOWN_CACHE, CardScores, all_in_equity, all_in_equity_canonical, canonical_suits, card_from_string, cards_to_strings, hand_strength, showdown_equity_batch
+from monte_carlo_tree_search import ISMCTS, MCTS, Node, NormalizedBackup
 import random
-import copy
+import itertools
+import time
+
+# score the rollout showdowns against every opponent holding instead of one random guess
+EXACT_SHOWDOWN = True
+
+# exploration weight of the search trees, for rewards divided by the starting stack into [-1, 1]
+EXPLORATION = 0.25
 
 _TTTB = namedtuple("PokerBoard", "tup turn winner terminal money_machine money_middle money_opp raised_opp checked_opp raised_ma checked_ma raised_money_opp raised_money_ma folded")
 
@@ -55,8 +62,16 @@ class PokerBoard(_TTTB, Node):
         tmp_child_counter = 0
         moves = set()
 
+        if board.terminal:  # If the game is finished then no moves can be made
+            return set() 
+
         if (board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma: 
             # if either one of them is all in - open all cards
+            if EXACT_SHOWDOWN:
+                # no decision is left, a single terminal child with the exact expected outcome
+                # instead of one child for every runout
+                moves.add(board.all_in_showdown())
+                return moves
 
             moves = board.assign_cards_to_middle_all_combinations(1)
 
@@ -88,9 +103,6 @@ class PokerBoard(_TTTB, Node):
                 moves.add(PokerBoard(board.tup, turn, winner, terminal, board.money_machine, board.money_middle, board.money_opp, board.raised_opp, board.checked_opp, board.raised_ma, board.checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded))
                 return moves
 
-        if board.terminal:  # If the game is finished then no moves can be made
-            return set() 
-
         
         if board.turn: # turn machine
             if (board.raised_opp and board.raised_ma and (board.raised_money_opp > board.raised_money_ma)) or board.raised_opp and not board.raised_ma:
@@ -156,6 +168,9 @@ class PokerBoard(_TTTB, Node):
 
         if (board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma: 
             # if either one of them is all in - open all cards
+            if EXACT_SHOWDOWN:
+                return board.all_in_showdown()
+
             board = board.assign_cards_to_middle(5)
             board = board.assign_cards_to_middle(6)
 
@@ -176,13 +191,15 @@ class PokerBoard(_TTTB, Node):
             terminal = board.terminal
 
             if board.tup[5] == None : 
-                board = board.assign_cards_to_middle(5)
+                board = board.assign_cards_to_middle(5).canonical()
 
             elif board.tup[6] == None : 
-                board = board.assign_cards_to_middle(6)
+                board = board.assign_cards_to_middle(6).canonical()
 
             elif board.tup[6] != None :
-                winner, hand_with_score_ma, hand_with_score_opp = _find_winner(board.tup, folded=None)
+                # with EXACT_SHOWDOWN the winner is left to reward / batch_rewards, as in make_move
+                if not EXACT_SHOWDOWN:
+                    winner, hand_with_score_ma, hand_with_score_opp = _find_winner(board.tup, folded=None)
                 terminal = True
 
             checked_opp = False   
@@ -197,6 +214,26 @@ class PokerBoard(_TTTB, Node):
         if board.terminal:  # If the game is finished then no moves can be made
             return None
 
+        empty_spots = board.legal_moves()
+        random_choice = choice(empty_spots)
+        # print('Random CHOICE :\n ', random_choice)
+
+        board = board.make_move(random_choice[0], random_choice[1])
+        # print('RANDOM BAOARD : ', board)
+
+        # return board.make_move(random_choice[0], random_choice[1])
+        return board
+
+    def betting_open(board):
+        # a player has to act : not over, nobody all in and the betting round not closed
+        if board.terminal:
+            return False
+        if (board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma:
+            return False
+        return not ((board.checked_opp and board.checked_ma) or (board.raised_opp and board.raised_ma and (board.raised_money_opp == board.raised_money_ma)))
+
+    def legal_moves(board):
+        # the [action, raised money] moves of the player to act, for a board where the betting is open
         empty_spots = []
         if board.turn: # turn machine
 
@@ -258,14 +295,7 @@ class PokerBoard(_TTTB, Node):
                     for intervall in range(1,money_intervall+1):
                         empty_spots.append(['R', 5*intervall])
 
-        random_choice = choice(empty_spots)
-        # print('Random CHOICE :\n ', random_choice)
-
-        board = board.make_move(random_choice[0], random_choice[1])
-        # print('RANDOM BAOARD : ', board)
-
-        # return board.make_move(random_choice[0], random_choice[1])
-        return board
+        return empty_spots
 
     def reward(board):
         if not board.terminal:
@@ -278,18 +308,99 @@ class PokerBoard(_TTTB, Node):
         #if board.winner is None:
          #   return 0.5  # is a tie
 
-        if board.winner :
-            money_in_the_middle = board.money_middle
-            return money_in_the_middle # 10
-        else :
-            money_in_the_middle = board.money_middle
-            return -money_in_the_middle
+        # winner is True / False, or the machine's chance to win the showdown (see EXACT_SHOWDOWN)
+        # which makes the reward the expected money
+        winner = board.winner
+        if winner is None:
+            # showdown left by find_random_child
+            winner, hand_with_score_ma, hand_with_score_opp = _find_winner(board.tup, folded=None)
+        # zero-sum chips : the machine's stack at the end against an even split of all the chips, what the
+        # machine wins the opponent loses. Like tic_tac_toe the reward is for the player to act.
+        machine = (board.money_machine - board.money_opp) / 2 + (winner - 0.5) * board.money_middle
+        return machine if board.turn else -machine
         # The winner is neither True, False, nor None
         raise RuntimeError(f"board has unknown winner type {board.winner}")  
 
     def is_terminal(board):
         return board.terminal
 
+    def estimate(board):
+        # reward of a hand stopped before its end (MCTS truncate) : the machine's all in equity over the
+        # runouts and opponent holdings, cached and suit-canonical in cards.all_in_equity, as the winner
+        middle = [card for card in board.tup[2:7] if card != None]
+        win, tie = all_in_equity(board.tup[0:2], middle)
+        return board._replace(winner=win + tie / 2, terminal=True).reward()
+
+    def cache_info(board):
+        # hits and misses of the showdown and all in equity caches, for the hit rates of MCTS(instrument=True)
+        return {'showdown': SHOWDOWN_CACHE.cache_info()[:2], 'all_in_equity': all_in_equity_canonical.cache_info()[:2]}
+
+    def street(board):
+        # number of middle cards dealt : 3 on the flop, 4 on the turn, 5 on the river
+        return 5 - board.tup[2:7].count(None)
+
+    def batch_rewards(board, boards):
+        # the showdowns left by find_random_child are scored in one batch
+        pending = [b for b in boards if b.winner is None]
+        if pending:
+            equities = showdown_equity_batch([b.tup[0:2] for b in pending], [b.tup[2:7] for b in pending])
+            winners = iter([win + tie / 2 for win, tie in equities])
+            boards = [b._replace(winner=next(winners)) if b.winner is None else b for b in boards]
+        return [b.reward() for b in boards]
+
+    def is_chance(board):
+        # the betting round is closed and the next child deals the turn or the river card, or
+        # shows the cards on the river : nobody moves, the reward does not change sides
+        if board.terminal:
+            return False
+        if (board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma:
+            return not EXACT_SHOWDOWN
+        return (board.checked_opp and board.checked_ma) or (board.raised_opp and board.raised_ma and (board.raised_money_opp == board.raised_money_ma))
+
+    def has_random_children(board):
+        # without EXACT_SHOWDOWN the showdowns of find_children get the winner of one random opponent holding
+        return not EXACT_SHOWDOWN
+
+    def information_set(board):
+        # what both players can see, for the ISMCTS search of the opponent : the middle cards
+        # (suit-canonical) and the betting, not the hole cards nor a showdown's outcome
+        middle, = canonical_suits(board.tup[2:7])
+        tup = (None, None) + middle + (None,) * (5 - len(middle)) + (None, None)
+        return board._replace(tup=tup, winner=board.winner if board.folded else None)
+
+    def determinize(board):
+        # the hole cards of the player in the machine's seat, hidden from the search, dealt at random
+        # among the cards not seen. ISMCTS searches the opponent's moves on a mirrored board, where
+        # the machine's seat is the opponent's and the machine's own cards are in the opponent's slots
+        seen = [card for card in board.tup[2:9] if card is not None]
+        hole = random.sample([card for card in range(52) if card not in seen], 2)
+        return board._replace(tup=tuple(hole) + board.tup[2:9])
+
+    def mirrored(board):
+        # the same board from the other seat : the opponent's cards, money and betting in the machine's
+        # slots and the machine's in the opponent's, the other player to act
+        folded = {'ma': 'opp', 'opp': 'ma'}.get(board.folded)
+        winner = board.winner
+        if isinstance(winner, bool):
+            winner = not winner
+        elif winner is not None:  # the machine's chance to win
+            winner = 1 - winner
+        return PokerBoard(board.tup[7:9] + board.tup[2:7] + board.tup[0:2], not board.turn, winner, board.terminal, board.money_opp, board.money_middle, board.money_machine, board.raised_ma, board.checked_ma, board.raised_opp, board.checked_opp, board.raised_money_ma, board.raised_money_opp, folded)
+
+    def all_in_showdown(board):
+        # all in : the rest of the middle cards and the opponent cards are enumerated at once,
+        # winner is the machine's chance to win over all of them so the reward is the expected money
+        middle = [card for card in board.tup[2:7] if card is not None]
+        win, tie = all_in_equity(board.tup[0:2], middle)
+        return board._replace(turn=not board.turn, winner=win + tie / 2, terminal=True)
+
+    def canonical(board):
+        # same board with the suits renamed (and the cards of each group sorted), so that
+        # suit-isomorphic boards are equal and share one node in the tree
+        hole, middle, opp = canonical_suits(board.tup[0:2], board.tup[2:7], board.tup[7:9])
+        tup = hole + (None,) * (2 - len(hole)) + middle + (None,) * (5 - len(middle)) + opp + (None,) * (2 - len(opp))
+        return board._replace(tup=tup)
+
     def assign_cards(board, deck, cards=[]):
         random_card_list = []
         tup_tmp = board.tup
@@ -352,8 +463,8 @@ class PokerBoard(_TTTB, Node):
     def get_opponents_real_cards(board):
 
         # get real opp cards, which the machine doesn't know untill now
-        op_card_1 = input("opponnent Card 1 ? ")
-        op_card_2 = input("opponnent Card 2 ? ")
+        op_card_1 = card_from_string(input("opponnent Card 1 ? "))
+        op_card_2 = card_from_string(input("opponnent Card 2 ? "))
         board = board.assign_cards_to_middle(index=7,card=op_card_1)
         board = board.assign_cards_to_middle(index=8,card=op_card_2)
 
@@ -371,7 +482,8 @@ class PokerBoard(_TTTB, Node):
         raised_opp = False   
         raised_ma = False
 
-        turn = not board.turn
+        # dealing a card is not a move : the same player acts, as in find_random_child
+        turn = board.turn
 
         card_combos_in = CardScores()
         deck = card_combos_in.build_deck()
@@ -398,13 +510,13 @@ class PokerBoard(_TTTB, Node):
             deck.remove(already_existing_card)
 
         if index == 1 :
-            combi = card_combos_in.combinations(deck,2)
+            combi = itertools.combinations(deck,2)
 
             for combi_possibilities in combi:
                 tup = board.tup[:5] + (combi_possibilities[0],) + board.tup[5 + 1 :]
                 tup = tup[:6] + (combi_possibilities[1],) + tup[6 + 1 :]
 
-                moves.add(PokerBoard(tup, turn, winner, terminal, board.money_machine, board.money_middle, board.money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded))
+                moves.add(PokerBoard(tup, turn, winner, terminal, board.money_machine, board.money_middle, board.money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded).canonical())
 
             return moves
 
@@ -415,7 +527,7 @@ class PokerBoard(_TTTB, Node):
                 winner, hand_with_score_ma, hand_with_score_opp = _find_winner(tup, folded=None)
                 terminal = True
 
-            moves.add(PokerBoard(tup, turn, winner, terminal, board.money_machine, board.money_middle, board.money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded))
+            moves.add(PokerBoard(tup, turn, winner, terminal, board.money_machine, board.money_middle, board.money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded).canonical())
 
         return moves
 
@@ -425,14 +537,10 @@ class PokerBoard(_TTTB, Node):
             random_card = card
 
         else:
-            card_combos_in = CardScores()
-            deck = card_combos_in.build_deck()
-
-            random_card = random.choice(deck)
+            random_card = random.randrange(52)
 
             while random_card in board.tup:
-                deck.remove(random_card)
-                random_card = random.choice(deck)
+                random_card = random.randrange(52)
 
         tup = board.tup[:index] + (random_card,) + board.tup[index + 1 :]
         turn = not board.turn
@@ -516,7 +624,14 @@ class PokerBoard(_TTTB, Node):
 
         turn = not board.turn
         #if ((board.checked_opp and board.checked_ma) or (board.raised_opp and board.raised_ma and (board.raised_money_opp == board.raised_money_ma))) or ((board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma):
-        if not real :
+        showdown = False
+        if not real and EXACT_SHOWDOWN and folded == None and board.tup[6] != None:
+            # showdown : the winner is left to reward / batch_rewards, so that the
+            # showdowns of many rollouts can be scored together
+            winner = None
+            showdown = True
+
+        elif not real :
             winner, hand_with_score_ma, hand_with_score_opp = _find_winner(board.tup, folded)
 
         else :
@@ -534,14 +649,16 @@ class PokerBoard(_TTTB, Node):
             ### winner, _, _, _, _ = _find_winner_real(board.tup, folded)
          #   winner = None
 
-        is_terminal = (winner is not None) # or not any(v is None for v in tup)
+        is_terminal = (winner is not None) or showdown # or not any(v is None for v in tup)
 
         return PokerBoard(board.tup, turn, winner, is_terminal, money_machine, money_middle, money_opp, raised_opp, checked_opp, raised_ma, checked_ma, raised_money_opp, raised_money_ma, folded)
 
 
 
 def play_game():
-    tree = MCTS()
+    # the machine's tree times the phases of its rollouts, printed after every decision
+    tree = new_search_tree(instrument=True)
+    opponent_tree = new_search_tree(ISMCTS)
     card_combos = CardScores()
     deck = card_combos.build_deck()
     # create cards to play with 
@@ -706,7 +823,7 @@ def play_game():
 
                 board = PokerBoard(board.tup, turn, board.winner, board.terminal, board.money_machine, board.money_middle, board.money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded)
                 print('NEW 3 CARDS ARE OPENED IN THE MIDDLE')
-                print('CURRENT CARDS IN THE MIDDLE : ', board.tup)
+                print('CURRENT CARDS IN THE MIDDLE : ', cards_to_strings(board.tup))
                 # print('board with new cards : ',board)
                 turn_iteration += 1
                 board_exists = True
@@ -761,10 +878,15 @@ def play_game():
 
                     break
 
-                for _ in range(200):
-                    tree.do_rollout(board)
-
-                board = tree.choose(board)
+                # search on the suit-canonical board, so that suit-isomorphic states share
+                # one node, the chosen move is then played with the real cards
+                search_board = board.canonical()
+                # the states that can no longer be reached are freed, the rest of the tree is reused
+                print('Tree re-rooted : ', tree.reroot(search_board))
+                # an obvious move stops the search once it is clearly ahead of the others
+                board = tree.search(search_board, max_rollouts=200, confidence=0.95)._replace(tup=board.tup)
+                print('Machine decision : ', tree.last_search)
+                print('Search stats : ', tree.stats)
 
                 # dont wanna end the game with rollout moves (comes from simulation)
                 if board.terminal and (board.folded == None):
@@ -799,16 +921,14 @@ def play_game():
 
                 ### EXPERIMENTEL ###
                 # estimate opponents moves!
-                card_combos = CardScores()
-                deck_new = card_combos.build_deck()
-                for _ in range(10):
-                    deck_new = card_combos.build_deck()
-                    opponent_guess_board = copy.deepcopy(board)
-                    opponent_guess_board = opponent_guess_board.assign_cards_for_estimation(deck_new)
-                    for _ in range(100):
-                        tree.do_rollout(opponent_guess_board)
-
-                opponent_guess_board = tree.choose_estimate_with_level(opponent_guess_board,level=2)
+                # information set search : the nodes are what the opponent can see, and every
+                # rollout deals the opponent new random cards instead of 10 fixed guesses. The search
+                # plays the opponent from the machine's seat of the mirrored board, for at most 1 s
+                opponent_board = board.mirrored()
+                opponent_tree.reroot(opponent_board.information_set())
+                opponent_tree.search(opponent_board, deadline=time.monotonic() + 1, max_rollouts=1000)
+
+                opponent_guess_board = opponent_tree.choose_estimate_with_level(opponent_board,level=2).mirrored()
                 print('opponent_guess_board : ', opponent_guess_board)
                 print('\n')
 
@@ -875,7 +995,7 @@ def check_if_open_new_card(board):
         board = board.assign_cards_to_middle(6)
 
         print('ALL IN, OPENING ALL THE CARDS IN THE MIDDLE')
-        print(board.tup)
+        print(cards_to_strings(board.tup))
         print('\n')
 
         board = board.get_opponents_real_cards()
@@ -887,8 +1007,8 @@ def check_if_open_new_card(board):
 
             if board.folded is None :
 
-                print('machine : ' + hand_with_score_ma + ' , ' + str(c_h_best))
-                print('opponnent : ' + hand_with_score_opp + ' , ' + str(c_o_best))
+                print('machine : ' + hand_with_score_ma + ' , ' + str(cards_to_strings(c_h_best)))
+                print('opponnent : ' + hand_with_score_opp + ' , ' + str(cards_to_strings(c_o_best)))
 
         terminal = True
         turn = not board.turn
@@ -948,7 +1068,7 @@ def check_if_open_new_card(board):
         board = PokerBoard(board.tup, turn, winner, terminal, money_machine, money_middle, money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded)
         
         print('\nOPENED NEW CARD SINCE BOTH PLAYERS RAISED SAME AMOUNT OR BOTH CHECKED IN THE ROUND')
-        print('NEW CARDS : ', board.tup)
+        print('NEW CARDS : ', cards_to_strings(board.tup))
         print('\nNEW ROUND')
         print('BOARD SITUATION : ', board)
 
@@ -958,8 +1078,8 @@ def check_if_open_new_card(board):
 
             if board.folded is None :
 
-                print('machine : ' + hand_with_score_ma + ' , ' + str(c_h_best))
-                print('opponnent : ' + hand_with_score_opp + ' , ' + str(c_o_best))
+                print('machine : ' + hand_with_score_ma + ' , ' + str(cards_to_strings(c_h_best)))
+                print('opponnent : ' + hand_with_score_opp + ' , ' + str(cards_to_strings(c_o_best)))
 
     return board
 
@@ -979,6 +1099,12 @@ def _find_winner(tup, folded):
             winner = None
 
         # elif tup[6] != None and (((board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma) or (board.checked_opp and board.checked_ma) or (board.raised_opp and board.raised_ma and (board.raised_money_opp == board.raised_money_ma))):
+        elif EXACT_SHOWDOWN:
+            # machine's chance to win against every possible opponent holding, a tie counts half
+            # the reward then is the expected money instead of +/- the middle for one random guess
+            win, tie = card_combos.showdown_equity(tup[0:2], tup[2:7])
+            winner = win + tie / 2
+
         else:
             machine_hand = []
             opp_hand = []
@@ -987,9 +1113,7 @@ def _find_winner(tup, folded):
             deck = card_combos.build_deck()
             for i in range(0,7):
                 deck.remove(tup[i])
-            for i in range (0,2):
-                random_card = random.choice(deck)
-                opp_hand.append(random_card)
+            opp_hand.extend(random.sample(deck, 2))
             #############################
 
             opp_hand.append(tup[2])
@@ -1003,28 +1127,11 @@ def _find_winner(tup, folded):
                 machine_hand.append(tup[i])
                 # opp_hand.append(tup[i+2])
 
-            combi_hand = card_combos.combinations(machine_hand,5)
-            combi_opp = card_combos.combinations(opp_hand,5)
-
-            score_machine = 0
-            hand_with_score_ma = None
-            for c_h in combi_hand:
-                score_machine_tmp, hand_with_score_ma_tmp = card_combos.score_hand(machine_hand)
-
-                if score_machine_tmp*1000 > score_machine*1000:
-                    score_machine = score_machine_tmp
-                    hand_with_score_ma = hand_with_score_ma_tmp
-
-            score_opp = 0
-            hand_with_score_opp = None
-            for c_o in combi_opp:
-                score_opp_tmp, hand_with_score_opp_tmp = card_combos.score_hand(opp_hand)
+            # best hand of the 7 cards directly, without going through the 21 combinations
+            score_machine = card_combos.evaluate(machine_hand)
+            score_opp = card_combos.evaluate(opp_hand)
 
-                if score_opp_tmp*1000 > score_opp*1000:
-                    score_opp = score_opp_tmp
-                    hand_with_score_opp = hand_with_score_opp_tmp
-
-            if score_machine*1000 >= score_opp*1000: # for comma stellen 
+            if score_machine >= score_opp:
                 winner = True
             else:
                 winner = False
@@ -1065,28 +1172,14 @@ def _find_winner_real(tup, folded):
                 machine_hand.append(tup[i])
                 opp_hand.append(tup[i+2]) # get the real values from the tuple
 
-            combi_hand = card_combos.combinations(machine_hand,5)
-            combi_opp = card_combos.combinations(opp_hand,5)
-
-            score_machine = 0
-            for c_h in combi_hand:
-                score_machine_tmp, hand_with_score_ma_tmp = card_combos.score_hand(machine_hand)
-
-                if score_machine_tmp*1000 > score_machine*1000:
-                    score_machine = score_machine_tmp
-                    hand_with_score_ma = hand_with_score_ma_tmp
-                    c_h_best = c_h
+            # best hand of the 7 cards directly, c_h_best / c_o_best are the 5 cards making it
+            score_machine, c_h_best = card_combos.best_hand(machine_hand)
+            score_opp, c_o_best = card_combos.best_hand(opp_hand)
 
-            score_opp = 0
-            for c_o in combi_opp:
-                score_opp_tmp, hand_with_score_opp_tmp = card_combos.score_hand(opp_hand)
+            hand_with_score_ma = card_combos.hand_with_score(score_machine)
+            hand_with_score_opp = card_combos.hand_with_score(score_opp)
 
-                if score_opp_tmp*1000 > score_opp*1000:
-                    score_opp = score_opp_tmp
-                    hand_with_score_opp = hand_with_score_opp_tmp
-                    c_o_best = c_o
-
-            if score_machine*1000 >= score_opp*1000: # for comma stellen 
+            if score_machine >= score_opp:
                 winner = True
             else:
                 winner = False
@@ -1101,10 +1194,45 @@ def _find_winner_real(tup, folded):
 
     return winner, hand_with_score_ma, hand_with_score_opp, c_h_best, c_o_best
 
+def hand_strength_rollout(board):
+    # rollout policy for MCTS(rollout_policy=...) : instead of drawing uniformly from check, fold and
+    # every raise, the player to act bets with the strength of its cards (cards.hand_strength).
+    # Strong hands raise and call, weak ones check and fold, unknown cards play a middling hand.
+    # It does not make the search better : in mcts_benchmark.py policy the choice settles later than
+    # with uniform rollouts (after 404 against 368 rollouts), so new_search_tree leaves it off.
+    if not board.betting_open():
+        return board.find_random_child()
+
+    cards = board.tup[0:2] if board.turn else board.tup[7:9]
+    middle = [card for card in board.tup[2:7] if card != None]
+    strength = 0.5
+    if None not in cards and len(middle) >= 3:
+        strength = hand_strength(list(cards) + middle)
+
+    moves = board.legal_moves()
+    raises = len([move for move in moves if move[0] == 'R'])
+    weights = []
+    for action, money in moves:
+        if action == 'F':
+            weights.append((1 - strength) ** 2)
+        elif action == 'C':
+            weights.append(1 - strength)
+        else:  # calling a raise or one of the raise amounts
+            weights.append(strength / raises)
+
+    action, money = random.choices(moves, weights)[0]
+    return board.make_move(action, money)
+
+
 def new_poker_board():
     return PokerBoard(tup=(None,) *9, turn=False, winner=None, terminal=False, money_machine=20, money_middle=0, money_opp=20, raised_opp=False, checked_opp=False, raised_ma=False, checked_ma=False, raised_money_opp=0, raised_money_ma=0, folded=None)
 
 
+def new_search_tree(tree_class=MCTS, **tree_args):
+    # the rewards are chips, the tree scores them divided by the starting stack
+    return tree_class(EXPLORATION, backup=NormalizedBackup(new_poker_board().money_machine), **tree_args)
+
+
 if __name__ == "__main__":
     play_game()
 
@@ -39,9 +39,10 @@ PokerBoard(tup=('H2', 'S2', M1, M2, M3, O1, O2), turn=False, winner=None, termin
 
 from collections import namedtuple
 from random import choice
-from cards import CardScores
+from cards import CardScores, cards_to_strings
 from monte_carlo_tree_search import MCTS, Node
 import random
+import itertools
 
 _TTTB = namedtuple("PokerBoard", "tup turn winner terminal money_machine money_middle money_opp raised_opp checked_opp raised_ma checked_ma raised_money_opp raised_money_ma folded")
 
@@ -341,7 +342,7 @@ class PokerBoard(_TTTB, Node):
                 ind = index + 3
                 tup = tup_tmp[:ind] + (random_card,) + tup_tmp[ind + 1 :]
             tup_tmp = tup
-        print('assign_cards :', tup)
+        print('assign_cards :', cards_to_strings(tup))
 
         return PokerBoard(tup, board.turn, board.winner, board.terminal, board.money_machine, board.money_middle, board.money_opp, board.raised_opp, board.checked_opp, board.raised_ma, board.checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded)
 
@@ -381,7 +382,7 @@ class PokerBoard(_TTTB, Node):
             deck.remove(already_existing_card)
 
         if index == 1 :
-            combi = card_combos_in.combinations(deck,3)
+            combi = itertools.combinations(deck,3)
 
             for combi_possibilities in combi:
                 tup = board.tup[:2] + (combi_possibilities[0],) + board.tup[2 + 1 :]
@@ -405,14 +406,10 @@ class PokerBoard(_TTTB, Node):
 
     def assign_cards_to_middle(board,index):
 
-        card_combos_in = CardScores()
-        deck = card_combos_in.build_deck()
-
-        random_card = random.choice(deck)
+        random_card = random.randrange(52)
 
         while random_card in board.tup:
-            deck.remove(random_card)
-            random_card = random.choice(deck)
+            random_card = random.randrange(52)
 
         tup = board.tup[:index] + (random_card,) + board.tup[index + 1 :]
         turn = not board.turn
@@ -691,10 +688,10 @@ def _find_winner(tup, folded):
                 machine_hand.append(tup[i])
                 opp_hand.append(tup[i+2])
 
-            score_machine, hand_with_score_ma = card_combos.score_hand(machine_hand)
-            score_opp, hand_with_score_opp = card_combos.score_hand(opp_hand)
+            score_machine = card_combos.evaluate(machine_hand)
+            score_opp = card_combos.evaluate(opp_hand)
 
-            if score_machine*1000 >= score_opp*1000: # for comma stellen 
+            if score_machine >= score_opp:
                 winner = True
             else:
                 winner = False
@@ -24,16 +24,13 @@ PokerBoard(tup=('H2', 'S2', M1, M2, M3, O1, O2), turn=False, winner=None, termin
 
 from collections import namedtuple
 from random import choice
-from cards import CardScores
-from monte_carlo_tree_search import MCTS, Node
+from cards import SHOWDOWN_CACHE, CardScores, all_in_equity, all_in_equity_canonical, canonical_suits, card_from_string, cards_to_strings, hand_strength, showdown_equity_batch
+from monte_carlo_tree_search import ISMCTS, MCTS, Node, NormalizedBackup
 import random
-import copy
+import itertools
 import time
 import signal
 
-from func_timeout import func_timeout, FunctionTimedOut
-import timeout_decorator 
-
 
 
 def timeout_handler(signum, frame):   # Custom signal handler
@@ -42,6 +39,12 @@ def timeout_handler(signum, frame):   # Custom signal handler
 
 
 
+# score the rollout showdowns against every opponent holding instead of one random guess
+EXACT_SHOWDOWN = True
+
+# exploration weight of the search trees, for rewards divided by the starting stack into [-1, 1]
+EXPLORATION = 0.25
+
 _TTTB = namedtuple("PokerBoard", "tup turn winner terminal money_machine money_middle money_opp raised_opp checked_opp raised_ma checked_ma raised_money_opp raised_money_ma folded")
 
 class PokerBoard(_TTTB, Node):
@@ -54,8 +57,16 @@ class PokerBoard(_TTTB, Node):
 		tmp_child_counter = 0
 		moves = set()
 
+		if board.terminal:  # If the game is finished then no moves can be made
+			return set() 
+
 		if (board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma: 
 			# if either one of them is all in - open all cards
+			if EXACT_SHOWDOWN:
+				# no decision is left, a single terminal child with the exact expected outcome
+				# instead of one child for every runout
+				moves.add(board.all_in_showdown())
+				return moves
 
 			moves = board.assign_cards_to_middle_all_combinations(1)
 
@@ -87,9 +98,6 @@ class PokerBoard(_TTTB, Node):
 				moves.add(PokerBoard(board.tup, turn, winner, terminal, board.money_machine, board.money_middle, board.money_opp, board.raised_opp, board.checked_opp, board.raised_ma, board.checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded))
 				return moves
 
-		if board.terminal:  # If the game is finished then no moves can be made
-			return set() 
-
 		
 		if board.turn: # turn machine
 			if (board.raised_opp and board.raised_ma and (board.raised_money_opp > board.raised_money_ma)) or board.raised_opp and not board.raised_ma:
@@ -155,6 +163,9 @@ class PokerBoard(_TTTB, Node):
 
 		if (board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma: 
 			# if either one of them is all in - open all cards
+			if EXACT_SHOWDOWN:
+				return board.all_in_showdown()
+
 			board = board.assign_cards_to_middle(5)
 			board = board.assign_cards_to_middle(6)
 
@@ -175,13 +186,15 @@ class PokerBoard(_TTTB, Node):
 			terminal = board.terminal
 
 			if board.tup[5] == None : 
-				board = board.assign_cards_to_middle(5)
+				board = board.assign_cards_to_middle(5).canonical()
 
 			elif board.tup[6] == None : 
-				board = board.assign_cards_to_middle(6)
+				board = board.assign_cards_to_middle(6).canonical()
 
 			elif board.tup[6] != None :
-				winner, hand_with_score_ma, hand_with_score_opp = _find_winner(board.tup, folded=None)
+				# with EXACT_SHOWDOWN the winner is left to reward / batch_rewards, as in make_move
+				if not EXACT_SHOWDOWN:
+					winner, hand_with_score_ma, hand_with_score_opp = _find_winner(board.tup, folded=None)
 				terminal = True
 
 			checked_opp = False   
@@ -196,6 +209,26 @@ class PokerBoard(_TTTB, Node):
 		if board.terminal:  # If the game is finished then no moves can be made
 			return None
 
+		empty_spots = board.legal_moves()
+		random_choice = choice(empty_spots)
+		# print('Random CHOICE :\n ', random_choice)
+
+		board = board.make_move(random_choice[0], random_choice[1])
+		# print('RANDOM BAOARD : ', board)
+
+		# return board.make_move(random_choice[0], random_choice[1])
+		return board
+
+	def betting_open(board):
+		# a player has to act : not over, nobody all in and the betting round not closed
+		if board.terminal:
+			return False
+		if (board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma:
+			return False
+		return not ((board.checked_opp and board.checked_ma) or (board.raised_opp and board.raised_ma and (board.raised_money_opp == board.raised_money_ma)))
+
+	def legal_moves(board):
+		# the [action, raised money] moves of the player to act, for a board where the betting is open
 		empty_spots = []
 		if board.turn: # turn machine
 
@@ -257,14 +290,7 @@ class PokerBoard(_TTTB, Node):
 					for intervall in range(1,money_intervall+1):
 						empty_spots.append(['R', 5*intervall])
 
-		random_choice = choice(empty_spots)
-		# print('Random CHOICE :\n ', random_choice)
-
-		board = board.make_move(random_choice[0], random_choice[1])
-		# print('RANDOM BAOARD : ', board)
-
-		# return board.make_move(random_choice[0], random_choice[1])
-		return board
+		return empty_spots
 
 	def reward(board):
 		"""
@@ -272,19 +298,101 @@ class PokerBoard(_TTTB, Node):
 		Input : board
 		Output : reward
 		"""
-		reward_to_get = board.money_middle
 		if not board.terminal:
 			raise RuntimeError("reward called on nonterminal board ")
-		if board.winner :
-			return -reward_to_get # 10
-		else :
-			return reward_to_get
+		# winner is True / False, or the machine's chance to win the showdown (see EXACT_SHOWDOWN)
+		# which makes the reward the expected money
+		winner = board.winner
+		if winner is None:
+			# showdown left by find_random_child
+			winner, hand_with_score_ma, hand_with_score_opp = _find_winner(board.tup, folded=None)
+		# zero-sum chips : the machine's stack at the end against an even split of all the chips, what the
+		# machine wins the opponent loses. Like tic_tac_toe the reward is for the player to act.
+		machine = (board.money_machine - board.money_opp) / 2 + (winner - 0.5) * board.money_middle
+		return machine if board.turn else -machine
 
 		raise RuntimeError("board has unknown winner type")  
 
 	def is_terminal(board):
 		return board.terminal
 
+	def estimate(board):
+		# reward of a hand stopped before its end (MCTS truncate) : the machine's all in equity over the
+		# runouts and opponent holdings, cached and suit-canonical in cards.all_in_equity, as the winner
+		middle = [card for card in board.tup[2:7] if card != None]
+		win, tie = all_in_equity(board.tup[0:2], middle)
+		return board._replace(winner=win + tie / 2, terminal=True).reward()
+
+	def cache_info(board):
+		# hits and misses of the showdown and all in equity caches, for the hit rates of MCTS(instrument=True)
+		return {'showdown': SHOWDOWN_CACHE.cache_info()[:2], 'all_in_equity': all_in_equity_canonical.cache_info()[:2]}
+
+	def street(board):
+		# number of middle cards dealt : 3 on the flop, 4 on the turn, 5 on the river
+		return 5 - board.tup[2:7].count(None)
+
+	def batch_rewards(board, boards):
+		# the showdowns left by find_random_child are scored in one batch
+		pending = [b for b in boards if b.winner is None]
+		if pending:
+			equities = showdown_equity_batch([b.tup[0:2] for b in pending], [b.tup[2:7] for b in pending])
+			winners = iter([win + tie / 2 for win, tie in equities])
+			boards = [b._replace(winner=next(winners)) if b.winner is None else b for b in boards]
+		return [b.reward() for b in boards]
+
+	def is_chance(board):
+		# the betting round is closed and the next child deals the turn or the river card, or
+		# shows the cards on the river : nobody moves, the reward does not change sides
+		if board.terminal:
+			return False
+		if (board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma:
+			return not EXACT_SHOWDOWN
+		return (board.checked_opp and board.checked_ma) or (board.raised_opp and board.raised_ma and (board.raised_money_opp == board.raised_money_ma))
+
+	def has_random_children(board):
+		# without EXACT_SHOWDOWN the showdowns of find_children get the winner of one random opponent holding
+		return not EXACT_SHOWDOWN
+
+	def information_set(board):
+		# what both players can see, for the ISMCTS search of the opponent : the middle cards
+		# (suit-canonical) and the betting, not the hole cards nor a showdown's outcome
+		middle, = canonical_suits(board.tup[2:7])
+		tup = (None, None) + middle + (None,) * (5 - len(middle)) + (None, None)
+		return board._replace(tup=tup, winner=board.winner if board.folded else None)
+
+	def determinize(board):
+		# the hole cards of the player in the machine's seat, hidden from the search, dealt at random
+		# among the cards not seen. ISMCTS searches the opponent's moves on a mirrored board, where
+		# the machine's seat is the opponent's and the machine's own cards are in the opponent's slots
+		seen = [card for card in board.tup[2:9] if card is not None]
+		hole = random.sample([card for card in range(52) if card not in seen], 2)
+		return board._replace(tup=tuple(hole) + board.tup[2:9])
+
+	def mirrored(board):
+		# the same board from the other seat : the opponent's cards, money and betting in the machine's
+		# slots and the machine's in the opponent's, the other player to act
+		folded = {'ma': 'opp', 'opp': 'ma'}.get(board.folded)
+		winner = board.winner
+		if isinstance(winner, bool):
+			winner = not winner
+		elif winner is not None:  # the machine's chance to win
+			winner = 1 - winner
+		return PokerBoard(board.tup[7:9] + board.tup[2:7] + board.tup[0:2], not board.turn, winner, board.terminal, board.money_opp, board.money_middle, board.money_machine, board.raised_ma, board.checked_ma, board.raised_opp, board.checked_opp, board.raised_money_ma, board.raised_money_opp, folded)
+
+	def all_in_showdown(board):
+		# all in : the rest of the middle cards and the opponent cards are enumerated at once,
+		# winner is the machine's chance to win over all of them so the reward is the expected money
+		middle = [card for card in board.tup[2:7] if card is not None]
+		win, tie = all_in_equity(board.tup[0:2], middle)
+		return board._replace(turn=not board.turn, winner=win + tie / 2, terminal=True)
+
+	def canonical(board):
+		# same board with the suits renamed (and the cards of each group sorted), so that
+		# suit-isomorphic boards are equal and share one node in the tree
+		hole, middle, opp = canonical_suits(board.tup[0:2], board.tup[2:7], board.tup[7:9])
+		tup = hole + (None,) * (2 - len(hole)) + middle + (None,) * (5 - len(middle)) + opp + (None,) * (2 - len(opp))
+		return board._replace(tup=tup)
+
 	def assign_cards(board, deck, cards=[]):
 		random_card_list = []
 		tup_tmp = board.tup
@@ -343,8 +451,8 @@ class PokerBoard(_TTTB, Node):
 	def get_opponents_real_cards(board):
 
 		# get real opp cards, which the machine doesn't know untill now
-		op_card_1 = input("opponnent Card 1 ? ")
-		op_card_2 = input("opponnent Card 2 ? ")
+		op_card_1 = card_from_string(input("opponnent Card 1 ? "))
+		op_card_2 = card_from_string(input("opponnent Card 2 ? "))
 		board = board.assign_cards_to_middle(index=7,card=op_card_1)
 		board = board.assign_cards_to_middle(index=8,card=op_card_2)
 
@@ -363,7 +471,8 @@ class PokerBoard(_TTTB, Node):
 		raised_opp = False   
 		raised_ma = False
 
-		turn = not board.turn
+		# dealing a card is not a move : the same player acts, as in find_random_child
+		turn = board.turn
 
 		card_combos_in = CardScores()
 		deck = card_combos_in.build_deck()
@@ -385,14 +494,14 @@ class PokerBoard(_TTTB, Node):
 			deck.remove(already_existing_card)
 
 		if index == 1 :
-			combi = card_combos_in.combinations(deck,2)
+			combi = itertools.combinations(deck,2)
 			# all 2 card possibilities will be added as possibility for opponents cards
 
 			for combi_possibilities in combi:
 				tup = board.tup[:5] + (combi_possibilities[0],) + board.tup[5 + 1 :]
 				tup = tup[:6] + (combi_possibilities[1],) + tup[6 + 1 :]
 
-				moves.add(PokerBoard(tup, turn, winner, terminal, board.money_machine, board.money_middle, board.money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded))
+				moves.add(PokerBoard(tup, turn, winner, terminal, board.money_machine, board.money_middle, board.money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded).canonical())
 
 			return moves
 
@@ -403,7 +512,7 @@ class PokerBoard(_TTTB, Node):
 				winner, hand_with_score_ma, hand_with_score_opp = _find_winner(tup, folded=None)
 				terminal = True
 
-			moves.add(PokerBoard(tup, turn, winner, terminal, board.money_machine, board.money_middle, board.money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded))
+			moves.add(PokerBoard(tup, turn, winner, terminal, board.money_machine, board.money_middle, board.money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded).canonical())
 
 		return moves
 
@@ -415,13 +524,10 @@ class PokerBoard(_TTTB, Node):
 
 		else:
 			# if no card id given, create a random card, whihc is not 'opened' in the middle
-			card_combos_in = CardScores()
-			deck = card_combos_in.build_deck()
-			random_card = random.choice(deck)
+			random_card = random.randrange(52)
 
 			while random_card in board.tup:
-				deck.remove(random_card)
-				random_card = random.choice(deck)
+				random_card = random.randrange(52)
 
 		# assign new card to board
 		tup = board.tup[:index] + (random_card,) + board.tup[index + 1 :]
@@ -508,7 +614,14 @@ class PokerBoard(_TTTB, Node):
 
 		turn = not board.turn
 		#if ((board.checked_opp and board.checked_ma) or (board.raised_opp and board.raised_ma and (board.raised_money_opp == board.raised_money_ma))) or ((board.money_opp == 0 or board.money_machine == 0 )and board.raised_money_opp == board.raised_money_ma):
-		if not real :
+		showdown = False
+		if not real and EXACT_SHOWDOWN and folded == None and board.tup[6] != None:
+			# showdown : the winner is left to reward / batch_rewards, so that the
+			# showdowns of many rollouts can be scored together
+			winner = None
+			showdown = True
+
+		elif not real :
 			winner, hand_with_score_ma, hand_with_score_opp = _find_winner(board.tup, folded)
 
 		else :
@@ -519,33 +632,29 @@ class PokerBoard(_TTTB, Node):
 			else :
 				winner = None
 
-		is_terminal = (winner is not None) # or not any(v is None for v in tup)
+		is_terminal = (winner is not None) or showdown # or not any(v is None for v in tup)
 
 		return PokerBoard(board.tup, turn, winner, is_terminal, money_machine, money_middle, money_opp, raised_opp, checked_opp, raised_ma, checked_ma, raised_money_opp, raised_money_ma, folded)
 
 
 
 
-def opponent_estimation(board,tree): 
+def opponent_estimation(board,tree,deadline): 
 	######  estimate opponents moves! ######
-	card_combos = CardScores()
-	deck_new = card_combos.build_deck()
-	for _ in range(10): # to assign n times random cards to opp for simulation
-		deck_new = card_combos.build_deck()
-		# create a copy of the board state so that the simulations for opponent can be done
-		opponent_guess_board = copy.deepcopy(board)
-		# assin random cards to opponent while 'removing' the machine cards so that opp doesnt know machine cards
-		opponent_guess_board = opponent_guess_board.assign_cards_for_estimation(deck_new)
-		# do simulations for the opponnet
-		for _ in range(100):
-			# time.sleep(3)
-			tree.do_rollout(opponent_guess_board) # Whatever your function that might hang
+	# tree is an ISMCTS : its nodes are what the opponent can see (information_set), and every rollout
+	# deals the opponent new random cards (determinize), instead of 10 fixed guesses of 100 rollouts each
+	# stops after 1000 rollouts or at the deadline (a time.monotonic() value)
+	# the search plays the opponent from the machine's seat of the mirrored board
+	opponent_board = board.mirrored()
+	tree.reroot(opponent_board.information_set())
+	tree.search(opponent_board, deadline=deadline, max_rollouts=1000)
+	print('Opponent estimation : ', tree.last_search.rollouts, 'rollouts in', round(tree.last_search.elapsed, 2), 's')
 
 	# 3 levels are declared for opponent
 	# level 3 : pro - takes the best action from simulations
 	# level 2 : middle - chooses random from best and second best action from simulation
 	# level 1 : noob - chooses random from third and second best action from simulation
-	opponent_guess_board = tree.choose_estimate_with_level(opponent_guess_board,level=2)
+	opponent_guess_board = tree.choose_estimate_with_level(opponent_board,level=2).mirrored()
 
 	if opponent_guess_board.raised_money_opp > board.raised_money_opp:
 		print('OPPPONNENT WILL PROBABLY RAISE MONEY BY ', opponent_guess_board.raised_money_opp-board.raised_money_opp)
@@ -559,11 +668,24 @@ def opponent_estimation(board,tree):
 	######  opponent estimation done! ######
 
 
-def machine_decision(board,tree): 
-	for _ in range(300):
-		tree.do_rollout(board)
-
-	board = tree.choose(board)
+def machine_decision(board,tree,deadline): 
+	# search on the suit-canonical board, so that suit-isomorphic states share
+	# one node, the chosen move is then played with the real cards
+	# stops after 300 rollouts or at the deadline (a time.monotonic() value), with the best move so far,
+	# or earlier once the best move is clearly ahead of the others
+	search_board = board.canonical()
+	# the states that can no longer be reached are freed, the rest of the tree is reused
+	print('Tree re-rooted : ', tree.reroot(search_board))
+	board = tree.search(search_board, deadline=deadline, max_rollouts=300, confidence=0.95)._replace(tup=board.tup)
+	report = tree.last_search
+	print('Machine decision : ', report.rollouts, 'rollouts in', round(report.elapsed, 2), 's, stopped :', report.stop_reason)
+	if report.stop_reason == 'confident':
+		print('Saved', report.rollouts_saved, 'rollouts and', round(report.seconds_saved, 2), 's')
+	stats = tree.stats
+	if stats is not None:
+		print('Search phases (s) : ', {phase: round(seconds, 3) for phase, seconds in stats.phase_seconds.items()})
+		print('Rollouts/sec :', round(stats.rollouts_per_sec), ' depth max', stats.max_depth, 'mean', round(stats.mean_depth, 1),
+			  ' branching', round(stats.branching, 1), ' nodes', stats.nodes, ' cache hit rates', stats.cache_hit_rates)
 
 	return board
 
@@ -571,7 +693,9 @@ def machine_decision(board,tree):
 
 
 def play_game():
-	tree = MCTS()
+	# the machine's tree times the phases of its rollouts, printed after every decision
+	tree = new_search_tree(instrument=True)
+	opponent_tree = new_search_tree(ISMCTS)
 	card_combos = CardScores()
 	deck = card_combos.build_deck()
 	# create cards to play with 
@@ -725,7 +849,7 @@ def play_game():
 
 				board = PokerBoard(board.tup, turn, board.winner, board.terminal, board.money_machine, board.money_middle, board.money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded)
 				print('NEW 3 CARDS ARE OPENED IN THE MIDDLE')
-				print('CURRENT CARDS IN THE MIDDLE : ', board.tup)
+				print('CURRENT CARDS IN THE MIDDLE : ', cards_to_strings(board.tup))
 				# print('board with new cards : ',board)
 				turn_iteration += 1
 				board_exists = True
@@ -755,19 +879,7 @@ def play_game():
 					break
 
 				#### buraya
-				try:
-					board = func_timeout(5, machine_decision, args=(board, tree))
-				except FunctionTimedOut:
-					print ( "Machine decicion time out, skip it dont wait it")
-					turn = not board.turn
-					if board.checked_opp :
-						checked_ma = True
-						# just check as default
-						board = PokerBoard(board.tup, turn, board.winner, board.terminal, board.money_machine, board.money_middle, board.money_opp, board.raised_opp, board.checked_opp, board.raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded)
-					elif board.raised_opp and not board.raised_ma:
-						raised_ma = True
-						raised_money_ma = board.raised_money_opp
-						board = PokerBoard(board.tup, turn, board.winner, board.terminal, board.money_machine, board.money_middle, board.money_opp, board.raised_opp, board.checked_opp, raised_ma, board.checked_ma, board.raised_money_opp, raised_money_ma, board.folded)
+				board = machine_decision(board, tree, deadline=time.monotonic() + 5)
 
 
 
@@ -803,12 +915,7 @@ def play_game():
 					break
 
 
-				try:
-					doitReturnValue = func_timeout(3, opponent_estimation, args=(board, tree))
-				except FunctionTimedOut:
-					print ( "Oppinent estimation time out, skip it dont wait it")
-
-				# Handle any exceptions that doit might raise here
+				opponent_estimation(board, opponent_tree, deadline=time.monotonic() + 1)
 
 				
 def check_board_terminal(board):
@@ -857,7 +964,7 @@ def check_if_open_new_card(board):
 		board = board.assign_cards_to_middle(6)
 
 		print('ALL IN, OPENING ALL THE CARDS IN THE MIDDLE')
-		print(board.tup)
+		print(cards_to_strings(board.tup))
 		print('\n')
 
 		board = board.get_opponents_real_cards()
@@ -869,8 +976,8 @@ def check_if_open_new_card(board):
 
 			if board.folded is None :
 
-				print('machine : ' + hand_with_score_ma + ' , ' + str(c_h_best))
-				print('opponnent : ' + hand_with_score_opp + ' , ' + str(c_o_best))
+				print('machine : ' + hand_with_score_ma + ' , ' + str(cards_to_strings(c_h_best)))
+				print('opponnent : ' + hand_with_score_opp + ' , ' + str(cards_to_strings(c_o_best)))
 
 		terminal = True
 		turn = not board.turn
@@ -927,7 +1034,7 @@ def check_if_open_new_card(board):
 		board = PokerBoard(board.tup, turn, winner, terminal, money_machine, money_middle, money_opp, raised_opp, checked_opp, raised_ma, checked_ma, board.raised_money_opp, board.raised_money_ma, board.folded)
 		
 		print('\nOPENED NEW CARD SINCE BOTH PLAYERS RAISED SAME AMOUNT OR BOTH CHECKED IN THE ROUND')
-		print('NEW CARDS : ', board.tup)
+		print('NEW CARDS : ', cards_to_strings(board.tup))
 		print('\nNEW ROUND')
 		print('BOARD SITUATION : ', board)
 
@@ -937,8 +1044,8 @@ def check_if_open_new_card(board):
 
 			if board.folded is None :
 
-				print('machine : ' + hand_with_score_ma + ' , ' + str(c_h_best))
-				print('opponnent : ' + hand_with_score_opp + ' , ' + str(c_o_best))
+				print('machine : ' + hand_with_score_ma + ' , ' + str(cards_to_strings(c_h_best)))
+				print('opponnent : ' + hand_with_score_opp + ' , ' + str(cards_to_strings(c_o_best)))
 
 	return board
 
@@ -955,6 +1062,12 @@ def _find_winner(tup, folded):
 		if tup[6] == None : # if the 3rd card in the middle IS NOT OPENED YET
 			winner = None
 
+		elif EXACT_SHOWDOWN:
+			# machine's chance to win against every possible opponent holding, a tie counts half
+			# the reward then is the expected money instead of +/- the middle for one random guess
+			win, tie = card_combos.showdown_equity(tup[0:2], tup[2:7])
+			winner = win + tie / 2
+
 		else:
 			machine_hand = []
 			opp_hand = []
@@ -963,9 +1076,7 @@ def _find_winner(tup, folded):
 			deck = card_combos.build_deck()
 			for i in range(0,7):
 				deck.remove(tup[i])
-			for i in range (0,2):
-				random_card = random.choice(deck)
-				opp_hand.append(random_card)
+			opp_hand.extend(random.sample(deck, 2))
 			#############################
 
 			opp_hand.append(tup[2])
@@ -978,30 +1089,11 @@ def _find_winner(tup, folded):
 			for i in range (0,7):
 				machine_hand.append(tup[i])
 
-			combi_hand = card_combos.combinations(machine_hand,5)
-			combi_opp = card_combos.combinations(opp_hand,5)
-
-			# calculate scores machine hand for all combination possibilities
-			score_machine = 0
-			hand_with_score_ma = None
-			for c_h in combi_hand:
-				score_machine_tmp, hand_with_score_ma_tmp = card_combos.score_hand(c_h)
-
-				if score_machine_tmp*1000 > score_machine*1000:
-					score_machine = score_machine_tmp
-					hand_with_score_ma = hand_with_score_ma_tmp
-
-			# calculate scores opponent hand for all combination possibilities
-			score_opp = 0
-			hand_with_score_opp = None
-			for c_o in combi_opp:
-				score_opp_tmp, hand_with_score_opp_tmp = card_combos.score_hand(c_o)
+			# best hand of the 7 cards directly, without going through the 21 combinations
+			score_machine = card_combos.evaluate(machine_hand)
+			score_opp = card_combos.evaluate(opp_hand)
 
-				if score_opp_tmp*1000 > score_opp*1000:
-					score_opp = score_opp_tmp
-					hand_with_score_opp = hand_with_score_opp_tmp
-
-			if score_machine*1000 >= score_opp*1000: # for comma position 
+			if score_machine >= score_opp:
 				winner = True
 			else:
 				winner = False
@@ -1037,32 +1129,15 @@ def _find_winner_real(tup, folded):
 				machine_hand.append(tup[i])
 				opp_hand.append(tup[i+2]) # get the real values from the tuple
  
-			# from 7 cards build the 5 card combination of each hand to calculate scores
-			combi_hand = card_combos.combinations(machine_hand,5)
-			combi_opp = card_combos.combinations(opp_hand,5)
-
-			# calculate scores machine hand for all combination possibilities
-			score_machine = 0
-			for c_h in combi_hand:
-				score_machine_tmp, hand_with_score_ma_tmp = card_combos.score_hand(c_h)
-
-				if score_machine_tmp*1000 > score_machine*1000:
-					score_machine = score_machine_tmp
-					hand_with_score_ma = hand_with_score_ma_tmp
-					c_h_best = c_h # get only the best
-
-			# calculate scores opponent hand for all combination possibilities
-			score_opp = 0
-			for c_o in combi_opp:
-				score_opp_tmp, hand_with_score_opp_tmp = card_combos.score_hand(c_o)
-
-				if score_opp_tmp*1000 > score_opp*1000:
-					score_opp = score_opp_tmp
-					hand_with_score_opp = hand_with_score_opp_tmp
-					c_o_best = c_o # get only the best
+			# best hand of the 7 cards directly, c_h_best / c_o_best are the 5 cards making it
+			score_machine, c_h_best = card_combos.best_hand(machine_hand)
+			score_opp, c_o_best = card_combos.best_hand(opp_hand)
+
+			hand_with_score_ma = card_combos.hand_with_score(score_machine)
+			hand_with_score_opp = card_combos.hand_with_score(score_opp)
 
 			# find the winner with comparing the best scores of both hands
-			if score_machine*1000 >= score_opp*1000: # for comma positions 
+			if score_machine >= score_opp:
 				winner = True
 			else:
 				winner = False
@@ -1078,11 +1153,46 @@ def _find_winner_real(tup, folded):
 
 	return winner, hand_with_score_ma, hand_with_score_opp, c_h_best, c_o_best
 
+def hand_strength_rollout(board):
+	# rollout policy for MCTS(rollout_policy=...) : instead of drawing uniformly from check, fold and
+	# every raise, the player to act bets with the strength of its cards (cards.hand_strength).
+	# Strong hands raise and call, weak ones check and fold, unknown cards play a middling hand.
+	# It does not make the search better : in mcts_benchmark.py policy the choice settles later than
+	# with uniform rollouts (after 404 against 368 rollouts), so new_search_tree leaves it off.
+	if not board.betting_open():
+		return board.find_random_child()
+
+	cards = board.tup[0:2] if board.turn else board.tup[7:9]
+	middle = [card for card in board.tup[2:7] if card != None]
+	strength = 0.5
+	if None not in cards and len(middle) >= 3:
+		strength = hand_strength(list(cards) + middle)
+
+	moves = board.legal_moves()
+	raises = len([move for move in moves if move[0] == 'R'])
+	weights = []
+	for action, money in moves:
+		if action == 'F':
+			weights.append((1 - strength) ** 2)
+		elif action == 'C':
+			weights.append(1 - strength)
+		else:  # calling a raise or one of the raise amounts
+			weights.append(strength / raises)
+
+	action, money = random.choices(moves, weights)[0]
+	return board.make_move(action, money)
+
+
 def new_poker_board():
 	# create new Pokerboard with init parameters
 	return PokerBoard(tup=(None,) *9, turn=False, winner=None, terminal=False, money_machine=30, money_middle=0, money_opp=30, raised_opp=False, checked_opp=False, raised_ma=False, checked_ma=False, raised_money_opp=0, raised_money_ma=0, folded=None)
 
 
+def new_search_tree(tree_class=MCTS, **tree_args):
+	# the rewards are chips, the tree scores them divided by the starting stack
+	return tree_class(EXPLORATION, backup=NormalizedBackup(new_poker_board().money_machine), **tree_args)
+
+
 if __name__ == "__main__":
 	play_game()
 
@@ -0,0 +1,180 @@
+"""
+Self-play tournament between two configurations of the machine's search, without input()
+
+    python poker_tournament.py              # 100 hands, uniform against hand strength rollouts
+    python poker_tournament.py 1000 4       # 1000 hands over 4 processes
+
+Every hand is played like a hand of play_game : the opponent opens with a forced raise, the
+machine matches it, the flop is dealt and the players bet until a fold or the showdown, the
+stacks carried to the next hand. The engines change seats every hand, the one in the
+opponent's seat plays from a mirrored board where its cards are the machine's, so that both
+search what they can see only.
+"""
+from collections import namedtuple
+import multiprocessing
+import random
+import statistics
+import sys
+import time
+
+from monte_carlo_tree_search import MCTS
+import poker_mcts
+from poker_mcts import _find_winner_real, hand_strength_rollout, new_poker_board, new_search_tree
+
+
+ANTE = 5  # forced raise of the first round, matched by the other player
+
+# chips_per_hand of the first engine, with its confidence interval [ci_low, ci_high], and the
+# 50th, 90th and 99th percentile of the seconds every engine took to decide, by engine name
+TournamentReport = namedtuple("TournamentReport", "hands sessions elapsed hands_per_sec chips_per_hand ci_low ci_high latency")
+
+
+class Engine:
+    "One configuration of the machine's search, playing either seat of a tournament"
+
+    def __init__(self, name, rollouts=200, seconds=None, confidence=0.95, exact_showdown=True, tree_class=MCTS, **tree_args):
+        self.name = name
+        self.rollouts = rollouts  # max_rollouts of every search
+        self.seconds = seconds  # deadline of every search, in seconds after it starts
+        self.confidence = confidence  # early stop of the search, as in the drivers
+        self.exact_showdown = exact_showdown  # poker_mcts.EXACT_SHOWDOWN while this engine searches
+        self.tree_class = tree_class
+        self.tree_args = tree_args  # passed to new_search_tree : rollout_policy, truncate, backup...
+        self.tree = None  # reused from decision to decision and from hand to hand, as in play_game
+
+    def decide(self, board):
+        "The (action, money) of the machine on board, its cards and the middle cards only"
+        exact_showdown = poker_mcts.EXACT_SHOWDOWN
+        poker_mcts.EXACT_SHOWDOWN = self.exact_showdown
+        try:
+            if self.tree is None:
+                self.tree = new_search_tree(self.tree_class, **self.tree_args)
+            search_board = board.canonical()
+            self.tree.reroot(search_board)
+            deadline = None if self.seconds is None else time.monotonic() + self.seconds
+            chosen = self.tree.search(search_board, deadline=deadline, max_rollouts=self.rollouts, confidence=self.confidence)
+        finally:
+            poker_mcts.EXACT_SHOWDOWN = exact_showdown
+        if chosen.folded is not None:
+            return 'F', 0
+        raised = chosen.raised_money_ma - board.raised_money_ma
+        return ('R', raised) if raised else ('C', 0)
+
+
+def seat_view(board, machine):
+    "board as the player of the machine's (True) or the opponent's seat sees it, from the machine's seat"
+    if not machine:
+        board = board.mirrored()
+    return board._replace(tup=board.tup[0:7] + (None, None))
+
+
+def _show(board, cards, middle):
+    "board with the first middle cards of cards (machine 2, middle 5, opponent 2) dealt"
+    return board._replace(tup=cards[0:2] + cards[2:2 + middle] + (None,) * (5 - middle) + cards[7:9])
+
+
+def _next_street(board, cards):
+    "What check_if_open_new_card does, without the prints and the input of the opponent's cards"
+    if board.terminal or board.betting_open():
+        return board
+    middle = board.street()
+    all_in = (board.money_opp == 0 or board.money_machine == 0) and board.raised_money_opp == board.raised_money_ma
+    if middle < 5 and not all_in:
+        # the next card, a new betting round with the same player to act
+        return _show(board, cards, middle + 1)._replace(raised_opp=False, checked_opp=False, raised_ma=False, checked_ma=False)
+    board = _show(board, cards, 5)
+    return board._replace(winner=_find_winner_real(board.tup, folded=None)[0], terminal=True)
+
+
+def play_hand(engines, stacks, latencies):
+    """One hand between engines[0] in the machine's seat and engines[1] in the opponent's, with the
+    chips in stacks, the seconds of their decisions appended to latencies. The machine's chips won"""
+    cards = tuple(random.sample(range(52), 9))
+    board = _show(new_poker_board()._replace(money_machine=stacks[0], money_opp=stacks[1]), cards, 0)
+    ante = min(ANTE, *stacks)
+    board = board.make_move('R', ante, real=True).make_move('R', ante, real=True)
+    # flop, the opponent acts first
+    board = _show(board, cards, 3)._replace(turn=False, raised_opp=False, raised_ma=False)
+
+    while True:
+        board = _next_street(board, cards)
+        if board.terminal:
+            break
+        seat = 0 if board.turn else 1
+        start = time.perf_counter()
+        action, money = engines[seat].decide(seat_view(board, board.turn))
+        latencies[seat].append(time.perf_counter() - start)
+        board = board.make_move(action, money, real=True)
+
+    money_machine = board.money_machine + (board.money_middle if board.winner else 0)
+    return money_machine - stacks[0]
+
+
+def play_match(engines, hands, seed=None, stack=None):
+    """hands hands between the two engines, changing seats every hand, with the stacks carried from
+    hand to hand. A new session with fresh stacks starts when a player has no chips left.
+    Returns the chips won by engines[0] in every hand, the seconds of every decision of each engine
+    and the number of sessions"""
+    random.seed(seed)
+    stack = stack or new_poker_board().money_machine
+    stacks = [stack, stack]
+    won, latencies, sessions = [], ([], []), 1
+    for hand in range(hands):
+        if 0 in stacks:
+            stacks = [stack, stack]
+            sessions += 1
+        seats = (0, 1) if hand % 2 == 0 else (1, 0)  # engine in the machine's seat, in the opponent's
+        chips = play_hand([engines[k] for k in seats], [stacks[k] for k in seats], [latencies[k] for k in seats])
+        if seats[0] == 1:
+            chips = -chips
+        won.append(chips)
+        stacks = [stacks[0] + chips, stacks[1] - chips]
+    return won, latencies, sessions
+
+
+def _percentiles(seconds, cuts=(50, 90, 99)):
+    if len(seconds) < 2:
+        return tuple(seconds[:1] * len(cuts)) or (0.0,) * len(cuts)
+    quantiles = statistics.quantiles(seconds, n=100, method='inclusive')
+    return tuple(quantiles[cut - 1] for cut in cuts)
+
+
+def tournament(engines, hands, workers=1, seed=0, level=0.95):
+    """Play hands hands between the two engines, in workers processes each playing its share of the
+    hands from its own seed, and report on engines[0] with a confidence interval at level"""
+    start = time.monotonic()
+    if workers > 1:
+        shares = [hands // workers + (k < hands % workers) for k in range(workers)]
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.starmap(play_match, [(engines, share, seed + k) for k, share in enumerate(shares)])
+    else:
+        results = [play_match(engines, hands, seed)]
+    elapsed = time.monotonic() - start
+
+    won = [chips for result in results for chips in result[0]]
+    mean = statistics.fmean(won)
+    half = 0.0
+    if len(won) > 1:
+        z = statistics.NormalDist().inv_cdf((1 + level) / 2)
+        half = z * statistics.stdev(won) / len(won) ** 0.5
+    latency = {engine.name: _percentiles([seconds for result in results for seconds in result[1][k]])
+               for k, engine in enumerate(engines)}
+    return TournamentReport(len(won), sum(result[2] for result in results), elapsed, len(won) / elapsed,
+                            mean, mean - half, mean + half, latency)
+
+
+def print_report(engines, report, level=0.95):
+    first, second = engines
+    print(f"{first.name} against {second.name} : {report.hands} hands in {report.sessions} sessions, "
+          f"{report.elapsed:.1f} s, {report.hands_per_sec:.2f} hands/sec")
+    print(f"{first.name} wins {report.chips_per_hand:+.2f} chips per hand, {level:.0%} interval "
+          f"[{report.ci_low:+.2f}, {report.ci_high:+.2f}]")
+    for name, (p50, p90, p99) in report.latency.items():
+        print(f"{name:<16} decision ms  p50 {1e3 * p50:7.1f}  p90 {1e3 * p90:7.1f}  p99 {1e3 * p99:7.1f}")
+
+
+if __name__ == "__main__":
+    hands = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    engines = (Engine("uniform"), Engine("hand strength", rollout_policy=hand_strength_rollout))
+    print_report(engines, tournament(engines, hands, workers))